@@ -0,0 +1,141 @@
+"""
+Fatoração de matrizes por mínimos quadrados alternados (ALS) com NumPy/SciPy.
+
+A matriz usuário-item R é aproximada por U V^T, com poucos fatores por usuário
+e por item: o modelo ocupa (usuários + itens) x fatores, em vez da similaridade
+itens x itens, e os scores de um usuário são um único produto U[u] @ V^T.
+
+Cada iteração fixa V e resolve um sistema fatores x fatores por usuário; depois
+fixa U e faz o mesmo por item. Os sistemas são montados e resolvidos em blocos
+de linhas (np.linalg.solve em lote), distribuídos entre threads: NumPy e SciPy
+liberam o GIL nessas operações.
+
+- explícito: ajusta as notas observadas, com regularização proporcional ao
+  número de avaliações da linha (weighted-λ).
+- implícito (Hu, Koren e Volinsky): toda avaliação indica preferência 1 com
+  confiança 1 + alpha * nota, e os itens não avaliados entram com preferência 0.
+"""
+import argparse
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+BLOCK_ENTRIES = 1 << 22  # floats dos produtos externos montados por bloco (~32 MB)
+
+def _row_blocks(indptr: np.ndarray, n_factors: int) -> list:
+    """
+    Divide as linhas em blocos (início, fim) com no máximo ~BLOCK_ENTRIES floats de produtos externos.
+    """
+    budget = max(1, BLOCK_ENTRIES // (n_factors * n_factors))
+    n_rows = len(indptr) - 1
+    blocks, start = [], 0
+    while start < n_rows:
+        end = int(np.searchsorted(indptr, indptr[start] + budget, side="right")) - 1
+        end = min(max(end, start + 1), start + budget, n_rows)
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+def _solve_block(matrix: sp.csr_matrix, fixed: np.ndarray, start: int, end: int, regularization: float,
+                 implicit: bool, alpha: float, gram: np.ndarray = None, outer: np.ndarray = None) -> np.ndarray:
+    """
+    Resolve os fatores das linhas start:end de matrix com os fatores do outro lado (fixed) fixos.
+    outer traz os produtos externos v v^T de todas as linhas de fixed, se já calculados.
+    """
+    lo, hi = matrix.indptr[start], matrix.indptr[end]
+    n_rows, n_factors = end - start, fixed.shape[1]
+    indptr = matrix.indptr[start:end + 1] - lo
+    values = np.asarray(matrix.data[lo:hi], dtype=np.float64)
+    if outer is None:  # produtos externos só das entradas do bloco
+        fixed = fixed[matrix.indices[lo:hi]]
+        outer = (fixed[:, :, None] * fixed[:, None, :]).reshape(len(fixed), -1)
+        columns = np.arange(hi - lo)
+    else:
+        columns = matrix.indices[lo:hi]
+
+    # Soma por linha de pesos * v v^T (lado esquerdo) e de alvos * v (lado direito) com produtos esparsos
+    if implicit:
+        weights, targets = alpha * values, 1 + alpha * values
+    else:
+        weights, targets = np.ones(hi - lo), values
+    shape = (n_rows, len(fixed))
+    lhs = (sp.csr_matrix((weights, columns, indptr), shape=shape) @ outer).reshape(n_rows, n_factors, n_factors)
+    rhs = sp.csr_matrix((targets, columns, indptr), shape=shape) @ fixed
+
+    identity = np.eye(n_factors)
+    if implicit:
+        lhs += gram + regularization * identity  # V^T V cobre os itens não avaliados (confiança 1)
+    else:
+        lhs += regularization * np.maximum(np.diff(indptr), 1)[:, None, None] * identity
+    return np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+
+def solve_factors(matrix: sp.csr_matrix, fixed: np.ndarray, regularization: float = 0.1, implicit: bool = False,
+                  alpha: float = 10.0, executor: Executor = None) -> np.ndarray:
+    """
+    Fatores de todas as linhas de matrix com os fatores das colunas (fixed) fixos.
+    Linhas sem avaliações recebem fatores nulos. Com executor, os blocos de linhas rodam em paralelo.
+    """
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed if implicit else None
+    # Com poucas colunas, os produtos externos de cada uma são calculados uma única vez
+    outer = None
+    if len(fixed) * n_factors * n_factors <= 4 * BLOCK_ENTRIES:
+        outer = (fixed[:, :, None] * fixed[:, None, :]).reshape(len(fixed), -1)
+    result = np.zeros((matrix.shape[0], n_factors))
+
+    def run(block: tuple):
+        start, end = block
+        result[start:end] = _solve_block(matrix, fixed, start, end, regularization, implicit, alpha, gram, outer)
+
+    blocks = _row_blocks(matrix.indptr, n_factors)
+    if executor is None:
+        for block in blocks:
+            run(block)
+    else:
+        list(executor.map(run, blocks))
+    return result
+
+def als_fit(matrix: sp.csr_matrix, factors: int = 32, regularization: float = 0.1, iterations: int = 10,
+            alpha: float = 10.0, implicit: bool = False, threads: int = 0, seed: int = 42) -> tuple:
+    """
+    Treina a fatoração da matriz usuário-item (CSR, 0 = não avaliado).
+    threads=0 usa uma thread por CPU. Retorna (fatores dos usuários, fatores dos itens).
+    """
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(0, 0.1, (matrix.shape[1], factors))
+    user_factors = np.zeros((matrix.shape[0], factors))
+    item_matrix = matrix.T.tocsr()
+    threads = threads or os.cpu_count() or 1
+
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="als") if threads > 1 else None
+    try:
+        for _ in range(iterations):
+            user_factors = solve_factors(matrix, item_factors, regularization, implicit, alpha, executor)
+            item_factors = solve_factors(item_matrix, user_factors, regularization, implicit, alpha, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return user_factors, item_factors
+
+def add_als_arguments(parser: argparse.ArgumentParser):
+    """
+    Opções do backend "als" para as linhas de comando (snapshot.py, evaluation.py, batch_job.py).
+    """
+    group = parser.add_argument_group("backend als")
+    group.add_argument("--factors", type=int, default=32, help="Fatores por usuário/item")
+    group.add_argument("--iterations", type=int, default=10, help="Iterações do ALS")
+    group.add_argument("--regularization", type=float, default=0.1)
+    group.add_argument("--alpha", type=float, default=10.0, help="Peso da confiança no modo implícito")
+    group.add_argument("--implicit", action="store_true", help="Trata as avaliações como feedback implícito")
+    group.add_argument("--threads", type=int, default=0, help="Threads do treino (0 = uma por CPU)")
+
+def als_options(args: argparse.Namespace) -> dict:
+    """
+    Opções do FactorModel a partir dos argumentos de add_als_arguments.
+    """
+    return {
+        "factors": args.factors, "iterations": args.iterations, "regularization": args.regularization,
+        "alpha": args.alpha, "implicit": args.implicit, "threads": args.threads,
+    }
@@ -1,34 +1,341 @@
-from fastapi import FastAPI
-import pandas as pd
-from recommender import get_recommendations, evaluate_accuracy, calculate_overall_accuracy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from pydantic import BaseModel, Field
+from catalog import ItemCatalog
+from catalog_index import CatalogIndex
+from recommender import BACKENDS, RecommenderModel, calculate_overall_accuracy, evaluate_accuracy
+from evaluation import calculate_overall_accuracy_fast, evaluate_metrics
+from ingestion import RatingIngestor
+from instrumentation import REQUEST_SECONDS, ModelCollector, profiling
+from cache import RecommendationCache, cached_recommendations
+from tasks import JobManager, SingleFlight, run_in_executor
+import snapshot
 
-items_df = pd.read_csv("items.csv")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    ingestor.flush()  # não perde avaliações ainda na janela de agrupamento
+    model_executor.shutdown(wait=False, cancel_futures=True)
+    jobs_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def measure_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Rótulo pela rota (ex.: /recomendar/{user_id}) para não criar uma série por usuário
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method, route.path if route else "desconhecida", str(response.status_code)
+    ).observe(time.perf_counter() - start)
+    return response
+
+# Catálogo com busca por ID/título em O(1), usado para montar as respostas
+catalog = ItemCatalog.from_csv("items.csv")
+
+def _env_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+# Modelo mantido em memória; avaliações novas são aplicadas incrementalmente.
+# RECOMMENDER_BACKEND=sparse usa matrizes CSR (catálogos grandes) e
+# RECOMMENDER_TOP_K limita o número de vizinhos guardados por item;
+# RECOMMENDER_BACKEND=als usa a fatoração de matrizes, configurada pelas variáveis ALS_*.
+# Cada requisição pode pedir outro backend com ?backend=, construído na primeira vez que for pedido.
+TOP_K = _env_int("RECOMMENDER_TOP_K")
+ALS_OPTIONS = {
+    "factors": int(os.getenv("ALS_FACTORS", "32")),
+    "iterations": int(os.getenv("ALS_ITERATIONS", "10")),
+    "regularization": float(os.getenv("ALS_REGULARIZATION", "0.1")),
+    "alpha": float(os.getenv("ALS_ALPHA", "10")),
+    "implicit": os.getenv("ALS_IMPLICIT", "0") == "1",
+    "threads": int(os.getenv("ALS_THREADS", "0")),
+}
+BACKEND_PATTERN = f"^({'|'.join(BACKENDS)})$"
+
+def _model_args(backend: str) -> dict:
+    return {"top_k": TOP_K, "options": ALS_OPTIONS if backend == "als" else None}
+
+DEFAULT_BACKEND = os.getenv("RECOMMENDER_BACKEND", "dense")
+model = RecommenderModel("ratings.csv", backend=DEFAULT_BACKEND, **_model_args(DEFAULT_BACKEND))
+
+# Estado do modelo restaurado do snapshot binário (memory-map, compartilhado entre workers);
+# sem snapshot compatível, o modelo é construído das avaliações e o snapshot gravado.
+# Para gravá-lo antes de subir a API: python snapshot.py --output model_snapshot
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", "model_snapshot")
+
+# Índice de itens similares, aberto com memory-map e validado junto com o snapshot (mesmo lock).
+# Só é reconstruído se o ratings.csv foi reescrito desde a sua construção: avaliações novas no
+# log não o invalidam. NEIGHBOR_INDEX_K, NEIGHBOR_INDEX_METHOD (exact ou lsh), NEIGHBOR_INDEX_BITS
+# e NEIGHBOR_INDEX_TABLES não informados mantêm os parâmetros do índice salvo (por exemplo, um
+# índice LSH construído à parte).
+NEIGHBOR_INDEX_DIR = os.getenv("NEIGHBOR_INDEX_DIR", os.path.join(MODEL_SNAPSHOT_DIR, "neighbors"))
+_, neighbor_index = snapshot.load_or_build(
+    model, MODEL_SNAPSHOT_DIR, NEIGHBOR_INDEX_DIR, k=_env_int("NEIGHBOR_INDEX_K"),
+    method=os.getenv("NEIGHBOR_INDEX_METHOD") or None, n_bits=_env_int("NEIGHBOR_INDEX_BITS"),
+    n_tables=_env_int("NEIGHBOR_INDEX_TABLES")
+)
+
+# Processos usados na avaliação geral (0 = um por CPU)
+EVAL_WORKERS = int(os.getenv("RECOMMENDER_EVAL_WORKERS", "1"))
+
+# Listagem do catálogo: busca por prefixo nos títulos, filtro por categoria e médias das avaliações
+# mantidas a partir do log (cada página custa o tamanho da página, não do catálogo ou das avaliações);
+# as médias iniciais vêm das avaliações do modelo, sem ler o CSV
+_, _ratings_df, _position = model.export_state()
+catalog_index = CatalogIndex(catalog, model.store, (_ratings_df, _position))
+
+# Avaliações recebidas pela API são agrupadas por uma janela curta antes de irem
+# para o log de avaliações e para o modelo
+ingestor = RatingIngestor(model.store, model, window_seconds=float(os.getenv("RATINGS_BATCH_WINDOW", "0.05")))
+
+# Cache das recomendações por (usuário, top_n), invalidado quando os dados do usuário mudam
+def _new_cache() -> RecommendationCache:
+    return RecommendationCache(
+        max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))
+    )
+
+recommendation_cache = _new_cache()
+
+# Modelos e caches por backend; só o padrão é construído na inicialização
+models = {model.backend: model}
+caches = {model.backend: recommendation_cache}
+
+# Tamanhos do modelo e contadores do cache, lidos a cada coleta de /metrics
+REGISTRY.register(ModelCollector(model, recommendation_cache))
+
+# Leitura de avaliações, atualização do modelo e pontuação rodam em um executor dedicado, fora do
+# event loop; avaliações do modelo rodam em segundo plano em outro executor, sem disputar com ele
+model_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RECOMMENDER_THREADS", "4")), thread_name_prefix="recommender"
+)
+jobs_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RECOMMENDER_JOB_THREADS", "1")), thread_name_prefix="recommender-jobs"
+)
+jobs = JobManager(jobs_executor)
+refresh_flight = SingleFlight()
+
+def _refresh(current: RecommenderModel):
+    ingestor.flush()  # inclui avaliações ainda na janela de agrupamento
+    current.refresh()
+
+async def refresh_model(current: RecommenderModel = model):
+    """
+    Atualiza o modelo com as avaliações novas. Requisições concorrentes que encontram os mesmos
+    arquivos de avaliações e a mesma fila de ingestão aguardam uma única atualização.
+    """
+    key = (current.backend, current.store.signature(), ingestor.submitted)
+    await refresh_flight.run(key, run_in_executor, model_executor, _refresh, current)
+
+def _build_model(backend: str):
+    other = RecommenderModel("ratings.csv", backend=backend, **_model_args(backend))
+    other.refresh()  # construção completa a partir das avaliações atuais
+    caches[backend] = _new_cache()
+    models[backend] = other
+
+async def get_model(backend: str | None) -> RecommenderModel:
+    """
+    Modelo do backend pedido (o padrão quando backend é None). Os demais backends são construídos
+    na primeira requisição que os pede; requisições concorrentes aguardam a mesma construção.
+    """
+    if backend is None:
+        return model
+    if backend not in models:
+        await refresh_flight.run(("construir", backend), run_in_executor, model_executor, _build_model, backend)
+    return models[backend]
+
+def _job_response(status: dict) -> JSONResponse:
+    # 200 com o resultado quando a tarefa já terminou; 202 enquanto ela está na fila ou em execução
+    status["status_url"] = f"/tarefas/{status['job_id']}"
+    return JSONResponse(status, status_code=200 if status["status"] in ("done", "error") else 202)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Manga Recommender API online"}
 
+class RatingIn(BaseModel):
+    user_id: int = Field(..., ge=1)
+    item_id: int = Field(..., ge=1)
+    rating: int = Field(..., ge=1, le=5)
+
+class RatingBatchIn(BaseModel):
+    ratings: list[RatingIn] = Field(..., min_length=1, max_length=10000)
+
+@app.post("/avaliacoes", status_code=202)
+async def adicionar_avaliacao(avaliacao: RatingIn):
+    if avaliacao.item_id not in catalog:
+        raise HTTPException(status_code=404, detail=f"Mangá {avaliacao.item_id} não encontrado.")
+    # Pode gravar o lote quando a fila enche, então roda fora do event loop
+    pending = await run_in_executor(model_executor, ingestor.submit, [(avaliacao.user_id, avaliacao.item_id, avaliacao.rating)])
+    return {"message": "Avaliação recebida.", "pending": pending}
+
+@app.post("/avaliacoes/lote", status_code=202)
+async def adicionar_avaliacoes_lote(lote: RatingBatchIn):
+    unknown = sorted({r.item_id for r in lote.ratings if r.item_id not in catalog})
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Mangás não encontrados: {unknown}")
+    pending = await run_in_executor(model_executor, ingestor.submit, [(r.user_id, r.item_id, r.rating) for r in lote.ratings])
+    return {"message": f"{len(lote.ratings)} avaliações recebidas.", "pending": pending}
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: list[int] = Field(..., min_length=1, max_length=10000)
+    top_n: int = Field(5, ge=1, le=100)
+
+def _with_profile(response: dict, profile: dict) -> dict:
+    # Com ?profile=true, a resposta inclui o tempo (ms) gasto em cada etapa
+    if profile is not None:
+        response["profile"] = {name: round(ms, 3) for name, ms in profile.items()}
+    return response
+
+@app.post("/recomendar/batch")
+async def recomendar_batch(request: BatchRecommendationRequest, profile: bool = False,
+                           backend: str | None = Query(None, pattern=BACKEND_PATTERN)):
+    with profiling(profile) as stages:
+        current = await get_model(backend)
+        await refresh_model(current)
+        # Os usuários fora do cache são pontuados de uma vez, com um único produto matriz-matriz;
+        # o modelo já foi atualizado por refresh_model
+        recs = await run_in_executor(
+            model_executor, cached_recommendations, caches[current.backend], current, request.user_ids, catalog,
+            request.top_n, refresh=False
+        )
+    return _with_profile({
+        "backend": current.backend,
+        "top_n": request.top_n,
+        "results": [{"user_id": user_id, "recommendations": recs[user_id]} for user_id in request.user_ids]
+    }, stages)
+
 @app.get("/recomendar/{user_id}")
-def recomendar(user_id: int):
-    # Recarrega o arquivo de avaliações a cada chamada
-    ratings_df = pd.read_csv("ratings.csv")
-    recs = get_recommendations(user_id, items_df, ratings_df)
-    return {"user_id": user_id, "recommendations": recs}
+async def recomendar(user_id: int, profile: bool = False, backend: str | None = Query(None, pattern=BACKEND_PATTERN)):
+    with profiling(profile) as stages:
+        current = await get_model(backend)
+        await refresh_model(current)
+        recs = await run_in_executor(
+            model_executor, cached_recommendations, caches[current.backend], current, [user_id], catalog, refresh=False
+        )
+    return _with_profile({"user_id": user_id, "backend": current.backend, "recommendations": recs[user_id]}, stages)
 
-@app.get("/avaliar_acuracia/{user_id}")
-def avaliar_acuracia(user_id: int):
-    # Recarrega o arquivo de avaliações a cada chamada
-    ratings_df = pd.read_csv("ratings.csv")
-    result = evaluate_accuracy(user_id, items_df, ratings_df)
+@app.get("/metrics")
+def metrics():
+    # Histogramas por etapa e por rota, tamanhos do modelo e contadores do cache (formato Prometheus).
+    # Síncrono de propósito: a coleta espera o lock do modelo, então roda no threadpool e não no event loop
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/estatisticas_cache")
+async def estatisticas_cache(backend: str | None = Query(None, pattern=BACKEND_PATTERN)):
+    # Acertos, faltas e descartes do cache de recomendações, para dimensioná-lo
+    cache = caches.get(backend or model.backend)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"O backend {backend} ainda não foi usado.")
+    return cache.stats()
+
+@app.get("/similares/{item_id}")
+async def similares(item_id: int, n: int = Query(10, ge=1, le=100)):
+    if item_id not in catalog:
+        raise HTTPException(status_code=404, detail=f"Mangá {item_id} não encontrado.")
+    return {
+        "item_id": item_id,
+        "similar": [
+            {**catalog.get(neighbor, ["item_id", "title", "category"]), "score": score}
+            for neighbor, score in neighbor_index.similar(item_id, n) if neighbor in catalog
+        ]
+    }
+
+def _catalog_page(query: str, category: str | None, page: int, per_page: int) -> dict:
+    ingestor.flush()  # inclui avaliações ainda na janela de agrupamento
+    catalog_index.refresh()
+    return catalog_index.search(query, category, page, per_page)
+
+@app.get("/catalogo")
+async def catalogo(
+    q: str = Query("", max_length=200),
+    category: str | None = None,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(12, ge=1, le=100)
+):
+    # Uma página do catálogo com a média e a quantidade de avaliações de cada item
+    return await run_in_executor(model_executor, _catalog_page, q, category, page, per_page)
+
+def _catalog_item(item_id: int):
+    ingestor.flush()
+    catalog_index.refresh()
+    return catalog_index.item(item_id)
+
+@app.get("/catalogo/{item_id}")
+async def catalogo_item(item_id: int):
+    # Dados de um mangá com a média e a quantidade de avaliações, sem varrer as avaliações
+    item = await run_in_executor(model_executor, _catalog_item, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Mangá {item_id} não encontrado.")
+    return item
+
+def _evaluate_user(user_id: int, backend: str) -> dict:
+    # Usa as avaliações já carregadas pelo modelo (recarregadas apenas se o arquivo mudou)
+    result = evaluate_accuracy(user_id, catalog, model.ratings_df, backend, **_model_args(backend))
     if "message" in result:
         return {"message": result["message"]}
     return result
 
+@app.get("/avaliar_acuracia/{user_id}")
+async def avaliar_acuracia(user_id: int, backend: str | None = Query(None, pattern=BACKEND_PATTERN)):
+    # Sem backend, avalia o backend padrão da API, como as demais rotas de avaliação
+    await refresh_model()
+    return await run_in_executor(model_executor, _evaluate_user, user_id, backend or model.backend)
+
 @app.get("/avaliar_acuracia_geral")
-def avaliar_acuracia_geral():
-    # Recarrega o arquivo de avaliações a cada chamada
-    ratings_df = pd.read_csv("ratings.csv")
-    result = calculate_overall_accuracy(items_df, ratings_df)
-    return result
\ No newline at end of file
+async def avaliar_acuracia_geral(backend: str | None = Query(None, pattern=BACKEND_PATTERN)):
+    # Roda em segundo plano: a resposta traz o job_id e o resultado é consultado em /tarefas/{job_id}.
+    # A mesma avaliação sobre a mesma versão dos dados é reaproveitada.
+    await refresh_model()
+    # Cópia: o job roda em segundo plano e o treino converte os tipos das colunas no próprio dataframe
+    ratings_df = await run_in_executor(model_executor, lambda: model.ratings_df.copy())
+    backend = backend or model.backend
+    if backend == "dense":
+        status = jobs.submit(
+            "acuracia_geral", (model.version, backend), calculate_overall_accuracy_fast, catalog, ratings_df,
+            EVAL_WORKERS
+        )
+    else:
+        # Os demais backends são treinados de novo com o treino de cada usuário (mais lento)
+        status = jobs.submit(
+            "acuracia_geral", (model.version, backend), calculate_overall_accuracy, catalog, ratings_df,
+            backend, **_model_args(backend)
+        )
+    return _job_response(status)
+
+@app.get("/avaliar_metricas")
+async def avaliar_metricas(
+    k: list[int] = Query([5, 10]),
+    split: str = Query("kfold", pattern="^(kfold|temporal)$"),
+    folds: int = Query(5, ge=2, le=20),
+    test_fraction: float = Query(0.3, gt=0, lt=1),
+    backend: str | None = Query(None, pattern=BACKEND_PATTERN)
+):
+    # Relatório com precision@k, recall@k, NDCG@k, MAP@k, cobertura, RMSE, tempo e memória,
+    # calculado em segundo plano como /avaliar_acuracia_geral
+    if any(value < 1 for value in k):
+        raise HTTPException(status_code=422, detail="Os valores de k devem ser positivos.")
+    await refresh_model()
+    ratings_df = await run_in_executor(model_executor, lambda: model.ratings_df.copy())
+    backend = backend or model.backend
+    key = (model.version, tuple(k), split, folds, test_fraction, backend)
+    status = jobs.submit(
+        "metricas", key, evaluate_metrics, catalog, ratings_df, ks=k, split=split, n_folds=folds,
+        test_fraction=test_fraction, backend=backend, **_model_args(backend)
+    )
+    return _job_response(status)
+
+@app.get("/tarefas/{job_id}")
+async def tarefa(job_id: str):
+    status = jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Tarefa {job_id} não encontrada.")
+    return _job_response(status)
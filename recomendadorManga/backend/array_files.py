@@ -0,0 +1,45 @@
+"""
+Gravação e leitura de diretórios com arrays .npy e um meta.json (snapshot do modelo e
+índice de vizinhos).
+
+Cada arquivo é escrito ao lado e trocado atomicamente: processos que estejam com a
+versão anterior mapeada continuam vendo as páginas antigas e nenhum leitor encontra
+um arquivo pela metade. O meta.json é gravado por último e marca o diretório como completo.
+"""
+import json
+import os
+
+import numpy as np
+
+def save_arrays(directory: str, arrays: dict):
+    """
+    Grava cada array de arrays ({nome: array}) em directory/nome.npy.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        path = os.path.join(directory, f"{name}.npy")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(path + ".tmp", path)
+
+def load_arrays(directory: str, names: list, mmap_mode: str = None) -> dict:
+    """
+    Abre os arrays gravados com save_arrays; com mmap_mode eles são mapeados em memória.
+    """
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+
+def write_meta(directory: str, meta: dict):
+    path = os.path.join(directory, "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+def read_meta(directory: str):
+    """
+    Conteúdo do meta.json do diretório, ou None se ele não existir.
+    """
+    path = os.path.join(directory, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
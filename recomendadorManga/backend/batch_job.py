@@ -0,0 +1,88 @@
+"""
+Job offline que gera as recomendações de todos os usuários de uma vez.
+
+O modelo é construído uma única vez e os usuários são pontuados em blocos
+(produto matriz-matriz por bloco), de modo que a memória fica limitada a
+chunk_size x número de itens. Os resultados são gravados em streaming em
+JSONL (uma linha por usuário) ou Parquet (uma linha por recomendação).
+
+Uso:
+    python batch_job.py --output recomendacoes.jsonl
+    python batch_job.py --output recomendacoes.parquet --format parquet --top-n 10
+"""
+import argparse
+import json
+
+from als import add_als_arguments, als_options
+from catalog import ItemCatalog
+from recommender import BACKENDS, RecommenderModel
+
+def iter_chunks(values: list, chunk_size: int):
+    """
+    Percorre a lista em blocos de tamanho chunk_size.
+    """
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+def write_jsonl(model: RecommenderModel, catalog: ItemCatalog, output: str, top_n: int, chunk_size: int) -> int:
+    """
+    Grava uma linha JSON {"user_id", "recommendations"} por usuário. Retorna o número de usuários.
+    """
+    total = 0
+    with open(output, "w", encoding="utf-8") as f:
+        for chunk in iter_chunks(model.user_ids(), chunk_size):
+            recs = model.recommend_batch(chunk, catalog, top_n)
+            for user_id in chunk:
+                f.write(json.dumps({"user_id": user_id, "recommendations": recs[user_id]}, ensure_ascii=False) + "\n")
+            total += len(chunk)
+    return total
+
+def write_parquet(model: RecommenderModel, catalog: ItemCatalog, output: str, top_n: int, chunk_size: int) -> int:
+    """
+    Grava um row group Parquet por bloco de usuários. Retorna o número de usuários.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("user_id", pa.int64()), ("rank", pa.int32()), ("item_id", pa.int64()),
+        ("title", pa.string()), ("category", pa.string()), ("score", pa.float64())
+    ])
+    total = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in iter_chunks(model.user_ids(), chunk_size):
+            recs = model.recommend_batch(chunk, catalog, top_n)
+            rows = [
+                {"user_id": user_id, "rank": rank, **rec}
+                for user_id in chunk
+                for rank, rec in enumerate(recs[user_id], start=1)
+            ]
+            table = pa.Table.from_pylist(rows, schema=schema) if rows else schema.empty_table()
+            writer.write_table(table)
+            total += len(chunk)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera recomendações para todos os usuários.")
+    parser.add_argument("--ratings", default="ratings.csv", help="Arquivo de avaliações")
+    parser.add_argument("--items", default="items.csv", help="Arquivo de itens")
+    parser.add_argument("--output", required=True, help="Arquivo de saída")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Usuários pontuados por bloco")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="dense")
+    parser.add_argument("--top-k", type=int, default=None, help="Vizinhos mantidos por item (backend esparso)")
+    add_als_arguments(parser)
+    args = parser.parse_args()
+
+    catalog = ItemCatalog.from_csv(args.items)
+    options = als_options(args) if args.backend == "als" else None
+    model = RecommenderModel(args.ratings, backend=args.backend, top_k=args.top_k, options=options)
+    model.refresh()
+
+    writer = write_parquet if args.format == "parquet" else write_jsonl
+    total = writer(model, catalog, args.output, args.top_n, args.chunk_size)
+    print(f"{total} usuários processados -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Benchmarks do recomendador: funções do modelo e endpoints HTTP sob carga.
+
+Para cada função (leitura das avaliações, montagem das matrizes, construção
+dos modelos item-item e ALS, recomendações, avaliação de acurácia, índice de vizinhos) mede a
+latência de cada chamada (p50/p99), a vazão e o pico de memória (RSS) durante
+a execução. Com --http, sobe a API (uvicorn) sobre o mesmo conjunto de dados
+e dispara requisições concorrentes, medindo latência, vazão, erros e o pico de
+RSS do servidor.
+
+O resultado é gravado em JSON e pode ser comparado com uma execução anterior
+(--compare): métricas que pioraram além da tolerância são listadas e o
+processo termina com código 1.
+
+Uso:
+    python synthetic_data.py --users 10000 --items 1000 --output-dir bench_data/10k_1k
+    python benchmark.py --data bench_data/10k_1k --output bench_10k_1k.json
+    python benchmark.py --data bench_data/10k_1k --http --concurrency 32 --requests 2000 --compare bench_10k_1k.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import psutil
+
+from catalog import ItemCatalog
+from evaluation import calculate_overall_accuracy_fast
+from neighbors import build_neighbor_index
+from ratings_store import RatingsStore
+from recommender import (
+    RecommenderModel, build_sparse_user_item_matrix, build_user_item_matrix,
+    calculate_overall_accuracy, get_recommendations
+)
+from synthetic_data import TITLE_WORDS
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Métricas comparadas com a linha de base: True quando um valor maior é pior
+COMPARED_METRICS = {"p50_ms": True, "p99_ms": True, "peak_rss_mb": True, "throughput_per_s": False}
+
+class PeakRSS:
+    """
+    Amostra, em uma thread, o RSS de um processo enquanto o bloco executa e guarda o maior valor (MB).
+    """
+
+    def __init__(self, pid: int = None, interval: float = 0.005):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            try:
+                self.peak_mb = max(self.peak_mb, self.process.memory_info().rss / 1024 ** 2)
+            except psutil.Error:
+                return
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "PeakRSS":
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def summarize(latencies: list, wall_seconds: float, peak_rss_mb: float, **extra) -> dict:
+    """
+    Resume as latências (segundos) de uma série de chamadas.
+    """
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "calls": len(ms),
+        "throughput_per_s": len(ms) / wall_seconds if wall_seconds > 0 else 0.0,
+        "mean_ms": float(ms.mean()) if len(ms) else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else 0.0,
+        "max_ms": float(ms.max()) if len(ms) else 0.0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        **extra,
+    }
+
+def bench(func, calls: list) -> dict:
+    """
+    Chama func uma vez para cada tupla de argumentos em calls, medindo cada chamada.
+    """
+    latencies = []
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        for args in calls:
+            call_start = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - call_start)
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall, rss.peak_mb)
+
+def _fits_dense(n_users: int, n_items: int, max_dense_cells: int) -> bool:
+    # Usuários x itens e itens x itens cabem no limite (a similaridade sem poda pode chegar a itens x itens)
+    return n_users * n_items <= max_dense_cells and n_items * n_items <= max_dense_cells
+
+def run_function_benchmarks(data_dir: str, repeat: int = 3, sample_users: int = 200, batch_size: int = 1000,
+                            max_dense_cells: int = 50_000_000, max_loop_users: int = 200, top_k: int = 50,
+                            seed: int = 42) -> dict:
+    """
+    Mede as funções do recomendador sobre o conjunto de dados em data_dir.
+    Funções com estado denso (usuários x itens ou itens x itens) acima de max_dense_cells, a
+    similaridade esparsa sem poda e o índice de vizinhos exato (até itens x itens entradas) acima
+    do mesmo limite e a avaliação geral original (uma reconstrução por usuário) acima de
+    max_loop_users são puladas. O backend esparso também é medido com top_k vizinhos por item.
+    """
+    ratings_path = os.path.join(data_dir, "ratings.csv")
+    catalog = ItemCatalog.from_csv(os.path.join(data_dir, "items.csv"))
+    ratings_df = RatingsStore(ratings_path).load()
+    users = ratings_df["user_id"].unique()
+    n_users, n_items = len(users), ratings_df["item_id"].nunique()
+    rng = np.random.default_rng(seed)
+    sample = [int(user) for user in rng.choice(users, min(sample_users, n_users), replace=False)]
+
+    dense_matrix_ok = n_users * n_items <= max_dense_cells
+    dense_sim_ok = _fits_dense(n_users, n_items, max_dense_cells)
+    skipped = lambda reason: {"skipped": reason}
+    results = {}
+
+    def run(name: str, enabled, func, calls):
+        if enabled is not True:
+            results[name] = skipped(enabled)
+            print(f"{name:<34} pulado: {enabled}")
+            return
+        results[name] = bench(func, calls)
+        r = results[name]
+        print(f"{name:<34} p50 {r['p50_ms']:10.2f} ms  p99 {r['p99_ms']:10.2f} ms  "
+              f"{r['throughput_per_s']:10.1f}/s  RSS {r['peak_rss_mb']:8.1f} MB")
+
+    too_big = f"estado denso acima de {max_dense_cells} células"
+    unpruned = f"similaridade sem poda pode passar de {max_dense_cells} entradas (use --top-k)"
+    all_pairs = f"índice exato compara mais de {max_dense_cells} pares de itens"
+    run("load_ratings", True, lambda: RatingsStore(ratings_path).load(), [()] * repeat)
+    run("build_user_item_matrix", dense_matrix_ok or too_big, build_user_item_matrix, [(ratings_df,)] * repeat)
+    run("build_sparse_user_item_matrix", True, build_sparse_user_item_matrix, [(ratings_df,)] * repeat)
+    run("fit_dense", dense_sim_ok or too_big, lambda: RecommenderModel(None, "dense").fit(ratings_df), [()] * repeat)
+    run("fit_sparse", dense_sim_ok or unpruned, lambda: RecommenderModel(None, "sparse").fit(ratings_df), [()] * repeat)
+    run(f"fit_sparse (top_k={top_k})", True,
+        lambda: RecommenderModel(None, "sparse", top_k=top_k).fit(ratings_df), [()] * repeat)
+    run("fit_als", True, lambda: RecommenderModel(None, "als").fit(ratings_df), [()] * repeat)
+    run("get_recommendations (sem modelo)", dense_sim_ok or too_big,
+        get_recommendations, [(user, catalog, ratings_df) for user in sample[:repeat]])
+
+    if dense_sim_ok:
+        model = RecommenderModel(None, "dense").fit(ratings_df)
+    else:
+        model = RecommenderModel(None, "sparse", top_k=top_k).fit(ratings_df)
+    run(f"model.get_recommendations ({model.backend})", True,
+        model.get_recommendations, [(user, catalog) for user in sample])
+    batch = [int(user) for user in rng.choice(users, min(batch_size, n_users), replace=False)]
+    run(f"model.recommend_batch ({model.backend}, {len(batch)})", True,
+        model.recommend_batch, [(batch, catalog)] * repeat)
+    als_model = RecommenderModel(None, "als").fit(ratings_df)
+    run("model.get_recommendations (als)", True, als_model.get_recommendations, [(user, catalog) for user in sample])
+    run(f"model.recommend_batch (als, {len(batch)})", True, als_model.recommend_batch, [(batch, catalog)] * repeat)
+
+    loop_ok = n_users <= max_loop_users and dense_sim_ok
+    run("calculate_overall_accuracy", loop_ok or f"mais de {max_loop_users} usuários ou {too_big}",
+        calculate_overall_accuracy, [(catalog, ratings_df)])
+    run("calculate_overall_accuracy_fast", dense_sim_ok or too_big,
+        calculate_overall_accuracy_fast, [(catalog, ratings_df)])
+    run("build_neighbor_index", dense_sim_ok or all_pairs, build_neighbor_index, [(ratings_df,)])
+    run("build_neighbor_index (lsh)", True, lambda: build_neighbor_index(ratings_df, method="lsh"), [()])
+
+    return {"n_users": int(n_users), "n_items": int(n_items), "n_ratings": int(len(ratings_df)), "results": results}
+
+async def _load(base_url: str, make_request, n_requests: int, concurrency: int) -> tuple:
+    """
+    Dispara n_requests requisições com concurrency clientes simultâneos. Retorna (latências, erros, duração).
+    """
+    latencies, errors = [], 0
+    remaining = iter(range(n_requests))
+
+    async def worker(client: httpx.AsyncClient, rng: np.random.Generator):
+        nonlocal errors
+        for _ in remaining:
+            method, path, body = make_request(rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, np.random.default_rng(seed)) for seed in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+def run_http_benchmarks(data_dir: str, concurrency: int = 16, n_requests: int = 1000, port: int = 8765,
+                        batch_size: int = 100, server_env: dict = None, startup_timeout: float = 600,
+                        max_dense_cells: int = 50_000_000, top_k: int = 50) -> dict:
+    """
+    Sobe a API sobre data_dir e mede os endpoints de recomendação sob carga concorrente.
+    Acima de max_dense_cells, a API usa o backend esparso com top_k vizinhos e o índice de vizinhos LSH.
+    """
+    ratings_df = RatingsStore(os.path.join(data_dir, "ratings.csv")).load()
+    users = ratings_df["user_id"].unique()
+    items = ratings_df["item_id"].unique()
+    if not _fits_dense(len(users), len(items), max_dense_cells):
+        server_env = {
+            "RECOMMENDER_BACKEND": "sparse", "RECOMMENDER_TOP_K": str(top_k), "NEIGHBOR_INDEX_METHOD": "lsh",
+            **(server_env or {})
+        }
+
+    scenarios = {
+        "GET /recomendar/{user_id}": lambda rng: ("GET", f"/recomendar/{int(rng.choice(users))}", None),
+        f"POST /recomendar/batch ({batch_size})": lambda rng: (
+            "POST", "/recomendar/batch", {"user_ids": [int(user) for user in rng.choice(users, batch_size)]}
+        ),
+        "GET /similares/{item_id}": lambda rng: ("GET", f"/similares/{int(rng.choice(items))}", None),
+        "GET /catalogo?q=": lambda rng: ("GET", f"/catalogo?q={rng.choice(TITLE_WORDS)[:3]}&page={rng.integers(1, 4)}", None),
+    }
+
+    env = {**os.environ, **(server_env or {})}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", BACKEND_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        cwd=data_dir, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        start = time.perf_counter()
+        while True:
+            try:
+                httpx.get(base_url + "/", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if server.poll() is not None or time.perf_counter() - start > startup_timeout:
+                    raise RuntimeError("A API não subiu para o benchmark HTTP.")
+                time.sleep(0.2)
+        results["startup_seconds"] = time.perf_counter() - start
+
+        for name, make_request in scenarios.items():
+            with PeakRSS(server.pid) as rss:
+                latencies, errors, wall = asyncio.run(_load(base_url, make_request, n_requests, concurrency))
+            results[name] = summarize(latencies, wall, rss.peak_mb, errors=errors, concurrency=concurrency)
+            r = results[name]
+            print(f"{name:<34} p50 {r['p50_ms']:10.2f} ms  p99 {r['p99_ms']:10.2f} ms  "
+                  f"{r['throughput_per_s']:10.1f}/s  RSS {r['peak_rss_mb']:8.1f} MB  erros {errors}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Lista as métricas que pioraram mais que tolerance (fração) em relação à linha de base.
+    """
+    regressions = []
+    for section in ("functions", "http"):
+        now = current.get(section) or {}
+        now = now.get("results", now)
+        before = baseline.get(section) or {}
+        before = before.get("results", before)
+        for name, result in now.items():
+            old = before.get(name)
+            if not isinstance(result, dict) or not isinstance(old, dict) or "skipped" in result or "skipped" in old:
+                continue
+            for metric, higher_is_worse in COMPARED_METRICS.items():
+                if not old.get(metric):
+                    continue
+                ratio = result[metric] / old[metric]
+                if (ratio > 1 + tolerance) if higher_is_worse else (ratio < 1 - tolerance):
+                    regressions.append(f"{section}/{name}: {metric} {old[metric]:.2f} -> {result[metric]:.2f} ({ratio:.2f}x)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do recomendador (funções e endpoints HTTP).")
+    parser.add_argument("--data", required=True, help="Diretório com items.csv e ratings.csv (ver synthetic_data.py)")
+    parser.add_argument("--output", help="Arquivo JSON com os resultados")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora tolerada na comparação (fração)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições das funções de construção")
+    parser.add_argument("--sample-users", type=int, default=200, help="Usuários nas medições por usuário")
+    parser.add_argument("--max-dense-cells", type=int, default=50_000_000)
+    parser.add_argument("--top-k", type=int, default=50, help="Vizinhos por item nas medições do backend esparso")
+    parser.add_argument("--no-functions", action="store_true", help="Não mede as funções")
+    parser.add_argument("--http", action="store_true", help="Mede também os endpoints HTTP sob carga")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Requisições por endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-cache", action="store_true", help="Desliga o cache de recomendações da API")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data)
+    report = {
+        "data": data_dir,
+        "environment": {
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+        },
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if not args.no_functions:
+        report["functions"] = run_function_benchmarks(
+            data_dir, repeat=args.repeat, sample_users=args.sample_users, max_dense_cells=args.max_dense_cells,
+            top_k=args.top_k
+        )
+    if args.http:
+        server_env = {"RECOMMENDATION_CACHE_SIZE": "0"} if args.no_cache else None
+        report["http"] = run_http_benchmarks(
+            data_dir, args.concurrency, args.requests, args.port, server_env=server_env,
+            max_dense_cells=args.max_dense_cells, top_k=args.top_k
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados salvos em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressões em relação a", args.compare)
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"Nenhuma regressão acima de {args.tolerance:.0%} em relação a {args.compare}")
+
+if __name__ == "__main__":
+    main()
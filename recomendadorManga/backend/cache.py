@@ -0,0 +1,118 @@
+"""
+Cache das respostas de recomendação.
+
+Guarda, por (usuário, top_n), as recomendações já calculadas junto com a
+versão dos dados do usuário (RecommenderModel.data_version). Uma entrada só é
+reaproveitada enquanto essa versão não mudar: avaliações novas de um usuário
+invalidam apenas as entradas dele, e uma reconstrução completa do modelo
+invalida todas. O tamanho é limitado (descarta a entrada usada há mais tempo)
+e cada entrada expira após ttl_seconds, o que limita por quanto tempo as
+recomendações de um usuário deixam de refletir avaliações de outros usuários.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from catalog import ItemCatalog
+from instrumentation import stage
+from recommender import RecommenderModel
+
+class RecommendationCache:
+    """
+    Cache LRU com expiração (TTL) e invalidação por versão, com contadores de uso.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (user_id, top_n) -> (versão, instante de gravação, recomendações)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # descartadas por falta de espaço
+        self.expirations = 0  # descartadas por TTL
+        self.invalidations = 0  # descartadas porque a versão dos dados mudou
+
+    def get(self, user_id: int, top_n: int, version: tuple):
+        """
+        Retorna as recomendações guardadas para a versão informada, ou None.
+        """
+        key = (user_id, top_n)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_version, stored_at, recs = entry
+                if stored_version != version:
+                    del self._entries[key]
+                    self.invalidations += 1
+                elif time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return recs
+            self.misses += 1
+            return None
+
+    def put(self, user_id: int, top_n: int, version: tuple, recs: list):
+        """
+        Guarda as recomendações calculadas com a versão informada.
+        """
+        if self.max_entries <= 0:
+            return
+        key = (user_id, top_n)
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), recs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+def cached_recommendations(cache: RecommendationCache, model: RecommenderModel, user_ids: list,
+                           items_df: ItemCatalog | pd.DataFrame, top_n: int = 5, refresh: bool = True) -> dict:
+    """
+    Recomendações de vários usuários, calculando (em um único lote) só as que não estão no cache.
+    Com refresh=False, não lê as avaliações novas (o chamador já atualizou o modelo).
+    Retorna um dicionário {user_id: recomendações}.
+    """
+    if refresh:
+        model.refresh()
+    # A versão é lida antes do cálculo: se avaliações chegarem no meio, a entrada fica com a
+    # versão antiga e é recalculada na próxima consulta, nunca o contrário
+    versions = {user_id: model.data_version(user_id) for user_id in user_ids}
+    results = {}
+    with stage("cache_lookup"):
+        for user_id, version in versions.items():
+            recs = cache.get(user_id, top_n, version)
+            if recs is not None:
+                results[user_id] = recs
+
+    missing = [user_id for user_id in versions if user_id not in results]
+    if missing:
+        computed = model.recommend_batch(missing, items_df, top_n, refresh=False)
+        for user_id in missing:
+            cache.put(user_id, top_n, versions[user_id], computed[user_id])
+            results[user_id] = computed[user_id]
+    return results
@@ -0,0 +1,80 @@
+"""
+Catálogo de itens com busca em O(1).
+
+As colunas de items.csv ficam em listas (valores nativos do Python, prontos
+para JSON) e dois dicionários mapeiam item_id e título para a posição do item,
+de modo que montar uma recomendação ou encontrar um mangá pelo título não
+varre o catálogo inteiro. Usado pelo backend e pelo frontend.
+"""
+import numpy as np
+import pandas as pd
+
+class ItemCatalog:
+    """
+    Colunas do catálogo em listas, com índices por item_id e por título.
+    Em IDs ou títulos repetidos vale a primeira ocorrência, como nas buscas com DataFrame.
+    """
+
+    def __init__(self, items_df: pd.DataFrame):
+        self.columns = list(items_df.columns)
+        self._columns = {col: items_df[col].tolist() for col in self.columns}
+        self.item_ids = items_df["item_id"].to_numpy(dtype=np.int64)
+        self._row_by_id = {}
+        for row, item_id in enumerate(self._columns["item_id"]):
+            self._row_by_id.setdefault(int(item_id), row)
+        self._row_by_title = {}
+        for row, title in enumerate(self._columns.get("title", [])):
+            self._row_by_title.setdefault(title, row)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "ItemCatalog":
+        return cls(pd.read_csv(path))
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._row_by_id
+
+    def column(self, name: str) -> list:
+        """
+        Valores de uma coluna, na ordem do arquivo.
+        """
+        return self._columns[name]
+
+    def row(self, item_id: int):
+        """
+        Posição do item no catálogo, ou None se ele não existir.
+        """
+        return self._row_by_id.get(item_id)
+
+    def get(self, item_id: int, columns: list = None):
+        """
+        Dicionário com os dados do item (todas as colunas ou só as informadas), ou None.
+        """
+        row = self._row_by_id.get(item_id)
+        if row is None:
+            return None
+        return {col: self._columns[col][row] for col in (columns or self.columns)}
+
+    def id_by_title(self, title: str):
+        """
+        item_id do mangá com o título informado, ou None.
+        """
+        row = self._row_by_title.get(title)
+        return None if row is None else self._columns["item_id"][row]
+
+    def records(self, item_ids: list, columns: list = None) -> list:
+        """
+        Dados de vários itens, na ordem informada; IDs fora do catálogo são ignorados.
+        """
+        return [record for record in (self.get(item_id, columns) for item_id in item_ids) if record is not None]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self._columns, columns=self.columns)
+
+def as_catalog(items) -> ItemCatalog:
+    """
+    Aceita um ItemCatalog ou o DataFrame de items.csv (convertido uma vez por chamada).
+    """
+    return items if isinstance(items, ItemCatalog) else ItemCatalog(items)
@@ -0,0 +1,215 @@
+"""
+Índice do catálogo para listagem paginada com busca e filtro por categoria.
+
+- Busca: os títulos são quebrados em palavras (sem acentos, minúsculas) e cada
+  prefixo de cada palavra aponta para as posições dos itens que o contêm, em
+  ordem. Uma busca com várias palavras intersecta as listas de cada uma, sem
+  varrer os títulos.
+- Categorias: posições dos itens de cada categoria, montadas uma única vez.
+- Médias: soma e contagem das notas de cada item, mantidas incrementalmente a
+  partir do log do RatingsStore (só os eventos novos são lidos a cada refresh);
+  a média por item fica igual ao groupby sobre as avaliações vigentes.
+
+Uma página custa o tamanho das listas intersectadas mais o tamanho da página,
+sem depender do número de avaliações.
+"""
+import math
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from catalog import ItemCatalog
+from instrumentation import stage
+from ratings_store import RatingsStore
+
+MAX_PREFIX_LENGTH = 20  # prefixos indexados por palavra; buscas mais longas conferem a palavra inteira
+_EMPTY = np.array([], dtype=np.int64)
+
+def tokenize(text) -> list:
+    """
+    Palavras de um texto, em minúsculas e sem acentos.
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return re.findall(r"\w+", "".join(char for char in text if not unicodedata.combining(char)))
+
+def _pair_keys(user_ids: np.ndarray, item_ids: np.ndarray) -> np.ndarray:
+    return (np.asarray(user_ids, dtype=np.int64) << 32) | np.asarray(item_ids, dtype=np.int64)
+
+class CatalogIndex:
+    """
+    Listagem do catálogo com busca por prefixo nos títulos, filtro por categoria, paginação e
+    média das avaliações de cada item. Com store, refresh() acompanha as avaliações gravadas.
+    ratings = (avaliações, posição no store) evita ler o arquivo na construção, quando as
+    avaliações já estão carregadas (por exemplo, por um modelo restaurado de snapshot).
+    """
+
+    def __init__(self, catalog: ItemCatalog, store: RatingsStore = None, ratings: tuple = None):
+        self.catalog = catalog
+        self.store = store
+        titles = catalog.column("title")
+
+        prefixes = {}
+        self._row_tokens = []
+        for row, title in enumerate(titles):
+            tokens = tokenize(title)
+            self._row_tokens.append(tokens)
+            seen = set()
+            for token in tokens:
+                for end in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                    prefix = token[:end]
+                    if prefix not in seen:
+                        seen.add(prefix)
+                        prefixes.setdefault(prefix, []).append(row)
+        self._prefixes = {prefix: np.asarray(rows, dtype=np.int64) for prefix, rows in prefixes.items()}
+
+        categories = {}
+        for row, category in enumerate(catalog.column("category")):
+            categories.setdefault(category, []).append(row)
+        self._category_rows = {category: np.asarray(rows, dtype=np.int64) for category, rows in categories.items()}
+
+        self._sums = np.zeros(len(catalog), dtype=np.int64)
+        self._counts = np.zeros(len(catalog), dtype=np.int64)
+        self._position = None
+        self._lock = threading.Lock()  # protege as somas e contagens
+        self._refresh_lock = threading.Lock()
+        if ratings is not None:
+            self.load_ratings(ratings[0])
+            self._position = ratings[1]
+        elif store is not None:
+            self.refresh()
+
+    def categories(self) -> list:
+        return sorted(self._category_rows)
+
+    def load_ratings(self, ratings_df: pd.DataFrame):
+        """
+        Recalcula as somas e contagens a partir de todas as avaliações.
+        Guarda, por par usuário/item, quantas linhas o par tem e a soma atual delas, para que
+        eventos posteriores substituam a contribuição do par por uma única linha ou a removam
+        (como o apply_log do RatingsStore).
+        """
+        pairs = ratings_df.groupby(["user_id", "item_id"])["rating"].agg(["size", "sum"])
+        users = pairs.index.get_level_values("user_id").to_numpy()
+        items = pairs.index.get_level_values("item_id").to_numpy()
+        order = np.argsort(_pair_keys(users, items), kind="stable")
+
+        by_item = ratings_df.groupby("item_id")["rating"].agg(["size", "sum"])
+        sums = np.zeros(len(self.catalog), dtype=np.int64)
+        counts = np.zeros(len(self.catalog), dtype=np.int64)
+        for item_id, size, total in zip(by_item.index.tolist(), by_item["size"].tolist(), by_item["sum"].tolist()):
+            row = self.catalog.row(item_id)
+            if row is not None:
+                sums[row], counts[row] = total, size
+
+        with self._lock:
+            self._pair_keys = _pair_keys(users, items)[order]
+            self._pair_counts = pairs["size"].to_numpy(dtype=np.int64)[order]
+            self._pair_sums = pairs["sum"].to_numpy(dtype=np.int64)[order]
+            self._new_pairs = {}  # pares fora do arquivo base -> nota
+            self._sums, self._counts = sums, counts
+
+    def apply_ratings(self, events: pd.DataFrame):
+        """
+        Aplica eventos de avaliação (user_id, item_id, rating; nota 0 remove) na ordem recebida.
+        """
+        with self._lock:
+            for user_id, item_id, rating in events[["user_id", "item_id", "rating"]].itertuples(index=False):
+                user_id, item_id, rating = int(user_id), int(item_id), int(rating)
+                key = (user_id << 32) | item_id
+                pos = int(np.searchsorted(self._pair_keys, key))
+                if pos < len(self._pair_keys) and self._pair_keys[pos] == key:
+                    # Pares do arquivo base: as linhas do par viram uma só com a nova nota
+                    old_count, old_sum = self._pair_counts[pos], self._pair_sums[pos]
+                    new_count = 1 if rating else 0
+                    self._pair_counts[pos], self._pair_sums[pos] = new_count, new_count * rating
+                else:
+                    old = self._new_pairs.pop(key, 0)
+                    old_count, old_sum = (1, old) if old else (0, 0)
+                    if rating:
+                        self._new_pairs[key] = rating
+                    new_count = 1 if rating else 0
+                row = self.catalog.row(item_id)
+                if row is not None:
+                    self._sums[row] += new_count * rating - old_sum
+                    self._counts[row] += new_count - old_count
+
+    def refresh(self) -> bool:
+        """
+        Lê as avaliações gravadas desde a última leitura; recarrega tudo se o arquivo base mudou.
+        Retorna True se as médias mudaram.
+        """
+        if self.store is None:
+            return False
+        with self._refresh_lock:
+            if self._position is not None:
+                events, position = self.store.changes_since(self._position)
+                if events is not None:
+                    if not events.empty:
+                        self.apply_ratings(events)
+                    self._position = position
+                    return not events.empty
+            ratings_df, position = self.store.load_with_position()
+            self.load_ratings(ratings_df)
+            self._position = position
+            return True
+
+    def _matching_rows(self, query: str, category: str = None):
+        # Posições (em ordem) dos itens que atendem à busca e à categoria; None = todos
+        rows = None
+        for token in dict.fromkeys(tokenize(query)):
+            matches = self._prefixes.get(token[:MAX_PREFIX_LENGTH], _EMPTY)
+            if len(token) > MAX_PREFIX_LENGTH:
+                matches = np.asarray(
+                    [row for row in matches if any(word.startswith(token) for word in self._row_tokens[row])],
+                    dtype=np.int64
+                )
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        if category is not None:
+            in_category = self._category_rows.get(category, _EMPTY)
+            rows = in_category if rows is None else np.intersect1d(rows, in_category, assume_unique=True)
+        return rows
+
+    def _record(self, row: int) -> dict:
+        record = {}
+        for col in self.catalog.columns:
+            value = self.catalog.column(col)[row]
+            record[col] = None if isinstance(value, float) and math.isnan(value) else value  # células vazias do CSV
+        count = int(self._counts[row])
+        record["avg_rating"] = float(self._sums[row] / count) if count else 0.0
+        record["rating_count"] = count
+        return record
+
+    def item(self, item_id: int):
+        """
+        Dados de um item com a média e a quantidade de avaliações, ou None se ele não estiver no catálogo.
+        """
+        row = self.catalog.row(item_id)
+        if row is None:
+            return None
+        with self._lock:
+            return self._record(row)
+
+    def search(self, query: str = "", category: str = None, page: int = 1, per_page: int = 12) -> dict:
+        """
+        Uma página do catálogo, na ordem do arquivo, com os itens cujo título tem palavras começando
+        por todas as palavras de query e, se informada, da categoria category.
+        """
+        with stage("catalog_search"):
+            rows = self._matching_rows(query, category)
+            total = len(self.catalog) if rows is None else len(rows)
+            start = (page - 1) * per_page
+            page_rows = range(start, min(start + per_page, total)) if rows is None else rows[start:start + per_page].tolist()
+            with self._lock:
+                items = [self._record(row) for row in page_rows]
+        return {
+            "query": query,
+            "category": category,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": math.ceil(total / per_page),
+            "items": items,
+        }
@@ -0,0 +1,386 @@
+"""
+Avaliação offline do recomendador.
+
+O LeaveOutEvaluator reproduz exatamente o resultado de evaluate_accuracy para
+todos os usuários, mas constrói a matriz usuário-item e a matriz de
+co-avaliações (X^T X) uma única vez. Esconder o conjunto de teste de um usuário
+só altera a linha desse usuário, então a matriz de treino é obtida com uma
+atualização de posto baixo (remove x_u x_u^T e soma x'_u x'_u^T) restrita às
+colunas que o usuário avaliou no treino, em vez de reconstruir tudo.
+
+evaluate_metrics gera um relatório com precision@k, recall@k, NDCG@k, MAP@k,
+cobertura do catálogo e RMSE para vários k de uma vez, com divisão k-fold ou
+temporal, junto com o tempo da construção e da pontuação, para qualquer backend
+do RecommenderModel (item-item ou fatoração ALS). O pico de memória (tracemalloc,
+que vale para o processo inteiro) só é medido pela linha de comando: na API ele
+incluiria as requisições concorrentes e deixaria todas mais lentas.
+
+Uso:
+    python evaluation.py --split kfold --folds 5 --k 5 10 20
+    python evaluation.py --split temporal --output relatorio.json
+    python evaluation.py --backend als --factors 64 --implicit
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from als import add_als_arguments, als_options
+from catalog import ItemCatalog, as_catalog
+from ratings_store import RatingsStore
+from recommender import BACKENDS, RecommenderModel, build_sparse_user_item_matrix, select_top_n
+
+LIKED_THRESHOLD = 4  # nota >= 4 considera "gostou"
+
+class LeaveOutEvaluator:
+    """
+    Avaliação treino/teste por usuário com o modelo construído uma única vez.
+    Usa a mesma divisão de evaluate_accuracy (amostragem com random_state fixo).
+    """
+
+    def __init__(self, items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame, top_n: int = 5,
+                 test_fraction: float = 0.3, random_state: int = 42):
+        self.top_n = top_n
+        self.test_fraction = test_fraction
+        self.random_state = random_state
+        self.known_items = set(as_catalog(items_df).item_ids.tolist())
+
+        matrix, user_ids, item_ids = build_sparse_user_item_matrix(ratings_df)
+        self.matrix = matrix
+        self.item_ids = item_ids
+        self.user_index = {int(user): idx for idx, user in enumerate(user_ids)}
+        self.item_index = {int(item): idx for idx, item in enumerate(item_ids)}
+        self.gram = (matrix.T @ matrix).toarray()  # produtos escalares entre itens
+        # Quantidade de linhas por item: um item só sai da matriz se todas as suas linhas forem escondidas
+        self.item_row_counts = np.bincount(
+            ratings_df["item_id"].map(self.item_index).to_numpy(), minlength=len(item_ids)
+        )
+        self.users = ratings_df["user_id"].unique()
+        self.user_rows = {int(user): rows for user, rows in ratings_df.groupby("user_id", sort=False)}
+
+    def split(self, user_id: int) -> tuple:
+        """
+        Divide as avaliações do usuário em (treino, teste), igual a evaluate_accuracy.
+        """
+        user_ratings = self.user_rows[user_id]
+        test_size = max(1, int(len(user_ratings) * self.test_fraction))
+        test_items = user_ratings.sample(test_size, random_state=self.random_state)
+        return user_ratings.drop(test_items.index), test_items
+
+    def _item_positions(self, item_ids) -> np.ndarray:
+        return np.fromiter((self.item_index[int(item)] for item in item_ids), dtype=int, count=len(item_ids))
+
+    def recommend_held_out(self, user_id: int, train_items: pd.DataFrame, test_items: pd.DataFrame) -> list:
+        """
+        Retorna os IDs recomendados ao usuário quando apenas train_items são conhecidos.
+        """
+        n_items = len(self.item_ids)
+        full_row = self.matrix.getrow(self.user_index[user_id]).toarray().ravel()
+
+        train_means = train_items.groupby("item_id")["rating"].mean()
+        train_row = np.zeros(n_items)
+        train_row[self._item_positions(train_means.index)] = train_means.to_numpy(dtype=np.float64)
+
+        rated = np.flatnonzero(train_row != 0)
+        if rated.size == 0:
+            return []  # nenhum item similar avaliado
+
+        # X'^T X' restrito às colunas avaliadas no treino: só a linha do usuário muda
+        gram_cols = (self.gram[:, rated]
+                     - np.outer(full_row, full_row[rated])
+                     + np.outer(train_row, train_row[rated]))
+        norms = np.sqrt(np.maximum(np.diag(self.gram) - full_row ** 2 + train_row ** 2, 0))
+        norms[norms == 0] = 1e-9  # evita divisão por zero
+        sim = gram_cols / (norms[:, None] * norms[rated][None, :])
+
+        scores = (sim @ train_row[rated]) / (np.abs(sim).sum(axis=1) + 1e-9)
+
+        present = self.item_row_counts - np.bincount(self._item_positions(test_items["item_id"]), minlength=n_items) > 0
+        candidates = np.flatnonzero(present & (train_row == 0))
+        top = candidates[select_top_n(scores[candidates], self.top_n)]
+        return [int(item) for item in self.item_ids[top] if item in self.known_items]
+
+    def evaluate_user(self, user_id: int) -> dict:
+        """
+        Mesmo resultado de evaluate_accuracy para um usuário.
+        """
+        user_ratings = self.user_rows.get(user_id)
+        if user_ratings is None or len(user_ratings) < 2:
+            return {"user_id": user_id, "message": "Usuário não tem avaliações suficientes para o teste de acurácia (requer pelo menos 2 avaliações)."}
+
+        train_items, test_items = self.split(user_id)
+        recommended = self.recommend_held_out(user_id, train_items, test_items)
+
+        if not recommended:
+            return {"user_id": user_id, "message": "Nenhuma recomendação encontrada para o usuário com base nos dados de treino."}
+
+        recommended_ids = set(recommended)
+        test_liked = set(test_items[test_items['rating'] >= LIKED_THRESHOLD]['item_id'])
+
+        if not test_liked:
+            return {"user_id": user_id, "message": "Nenhuma avaliação positiva (>=4) encontrada no conjunto de teste. A acurácia não pode ser calculada."}
+
+        hits = len(recommended_ids & test_liked)
+        return {
+            "user_id": user_id,
+            "recommended": list(recommended_ids),
+            "test_liked": list(test_liked),
+            "hits": hits,
+            "accuracy": hits / len(recommended)
+        }
+
+    def evaluate_users(self, user_ids: list) -> list:
+        return [self.evaluate_user(int(user_id)) for user_id in user_ids]
+
+    def evaluate_all(self, n_jobs: int = 1) -> list:
+        """
+        Avalia todos os usuários, opcionalmente em paralelo em um pool de processos.
+        A ordem dos resultados é sempre a ordem dos usuários no arquivo de avaliações.
+        """
+        users = [int(user) for user in self.users]
+        if n_jobs is None or n_jobs <= 0:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs == 1 or len(users) < 2 * n_jobs:
+            return self.evaluate_users(users)
+
+        chunk_size = -(-len(users) // (n_jobs * 4))
+        chunks = [users[start:start + chunk_size] for start in range(0, len(users), chunk_size)]
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as executor:
+            return [result for chunk in executor.map(_evaluate_chunk, chunks) for result in chunk]
+
+# Avaliador compartilhado por cada processo do pool (enviado uma única vez por processo)
+_worker_evaluator = None
+
+def _init_worker(evaluator: LeaveOutEvaluator):
+    global _worker_evaluator
+    _worker_evaluator = evaluator
+
+def _evaluate_chunk(user_ids: list) -> list:
+    return _worker_evaluator.evaluate_users(user_ids)
+
+def calculate_overall_accuracy_fast(items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame, n_jobs: int = 1) -> dict:
+    """
+    Mesmo resultado de calculate_overall_accuracy, construindo o modelo uma única vez.
+    """
+    results = LeaveOutEvaluator(items_df, ratings_df).evaluate_all(n_jobs)
+    all_accuracies = [result["accuracy"] for result in results if "accuracy" in result]
+
+    if not all_accuracies:
+        return {"message": "Nenhum usuário com dados suficientes para calcular a acurácia."}
+
+    overall_accuracy = sum(all_accuracies) / len(all_accuracies)
+    return {
+        "overall_accuracy": overall_accuracy,
+        "total_users_evaluated": len(all_accuracies)
+    }
+
+def split_ratings(ratings_df: pd.DataFrame, method: str = "kfold", n_folds: int = 5,
+                  test_fraction: float = 0.3, random_state: int = 42):
+    """
+    Gera pares (treino, teste) de avaliações.
+    Avaliações repetidas do mesmo par usuário/item são agregadas antes da divisão,
+    para que o mesmo par nunca apareça no treino e no teste ao mesmo tempo.
+
+    "kfold": embaralha os pares com random_state e gera n_folds divisões.
+    "temporal": como não há data nas avaliações, usa a ordem do arquivo e esconde
+    as últimas test_fraction avaliações de cada usuário (uma única divisão).
+    """
+    pairs = ratings_df.groupby(["user_id", "item_id"], sort=False)["rating"].mean().reset_index()
+
+    if method == "kfold":
+        if n_folds < 2:
+            raise ValueError("O k-fold requer pelo menos 2 folds.")
+        order = np.random.RandomState(random_state).permutation(len(pairs))
+        folds = np.empty(len(pairs), dtype=int)
+        folds[order] = np.arange(len(pairs)) % n_folds
+        for fold in range(n_folds):
+            yield pairs[folds != fold], pairs[folds == fold]
+    elif method == "temporal":
+        position = pairs.groupby("user_id").cumcount()
+        size = pairs.groupby("user_id")["item_id"].transform("size")
+        test_size = np.maximum(1, (size * test_fraction).astype(int))
+        is_test = (position >= size - test_size) & (size >= 2)
+        yield pairs[~is_test], pairs[is_test]
+    else:
+        raise ValueError(f"Divisão desconhecida: {method}")
+
+def _ranking_metrics(ranked: np.ndarray, relevant: set, ks: list) -> dict:
+    """
+    precision@k, recall@k, NDCG@k e AP@k (relevância binária) de uma lista ranqueada.
+    """
+    hits = np.array([item in relevant for item in ranked], dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, len(hits) + 2))
+    cumulative_hits = np.cumsum(hits)
+    metrics = {}
+    for k in ks:
+        hits_k = hits[:k]
+        ideal = discounts[:min(len(relevant), k)].sum()
+        precision_at_i = cumulative_hits[:k] / np.arange(1, len(hits_k) + 1)
+        metrics[f"precision@{k}"] = hits_k.sum() / k
+        metrics[f"recall@{k}"] = hits_k.sum() / len(relevant)
+        metrics[f"ndcg@{k}"] = (hits_k * discounts[:len(hits_k)]).sum() / ideal
+        metrics[f"map@{k}"] = (precision_at_i * hits_k).sum() / min(len(relevant), k)
+    return metrics
+
+def _measure(func, *args, memory: bool = False):
+    """
+    Executa func medindo o tempo de relógio e, com memory=True, o pico de memória alocada (tracemalloc).
+    Retorna (resultado, segundos, pico em MB ou None).
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+def _evaluate_fold(items_df: ItemCatalog | pd.DataFrame, train_df: pd.DataFrame, test_df: pd.DataFrame, ks: list,
+                   backend: str, top_k: int, chunk_size: int, options: dict = None,
+                   measure_memory: bool = False) -> dict:
+    """
+    Constrói o modelo com o treino e calcula as métricas no teste de uma divisão.
+    """
+    model, build_seconds, build_peak = _measure(
+        RecommenderModel(None, backend=backend, top_k=top_k, options=options).fit, train_df.copy(),
+        memory=measure_memory
+    )
+    max_k = max(ks)
+    catalog_items = set(as_catalog(items_df).item_ids.tolist())
+    catalog_array = np.fromiter(catalog_items, dtype=np.int64)
+    test_by_user = {
+        int(user): (rows["item_id"].to_numpy(), rows["rating"].to_numpy(dtype=np.float64))
+        for user, rows in test_df.groupby("user_id")
+    }
+
+    def score_all():
+        totals = {}
+        recommended = {k: set() for k in ks}
+        squared_errors = []
+        users_evaluated = 0
+        users = list(test_by_user)
+        for start in range(0, len(users), chunk_size):
+            known, block, scores, item_ids, available = model.score_block(users[start:start + chunk_size])
+            for row, user in enumerate(known):
+                test_items, test_ratings = test_by_user[user]
+
+                # RMSE: só pares cujo item existe no treino e com score não nulo
+                positions = np.minimum(np.searchsorted(item_ids, test_items), len(item_ids) - 1)
+                valid = item_ids[positions] == test_items
+                predicted = scores[row, positions[valid]]
+                errors = (predicted - test_ratings[valid]) ** 2
+                squared_errors.extend(errors[predicted != 0])
+
+                candidate_mask = block[row] == 0 if available is None else (block[row] == 0) & available
+                candidates = np.flatnonzero(candidate_mask)
+                ranked = item_ids[candidates[select_top_n(scores[row, candidates], max_k, item_ids[candidates])]]
+                ranked = ranked[np.isin(ranked, catalog_array)]
+                for k in ks:
+                    recommended[k].update(ranked[:k].tolist())
+
+                relevant = set(test_items[test_ratings >= LIKED_THRESHOLD].tolist())
+                if not relevant or len(ranked) == 0:
+                    continue
+                for name, value in _ranking_metrics(ranked, relevant, ks).items():
+                    totals[name] = totals.get(name, 0.0) + value
+                users_evaluated += 1
+        return totals, recommended, squared_errors, users_evaluated
+
+    (totals, recommended, squared_errors, users_evaluated), scoring_seconds, scoring_peak = _measure(
+        score_all, memory=measure_memory
+    )
+
+    metrics = {name: value / users_evaluated for name, value in totals.items()} if users_evaluated else {}
+    for k in ks:
+        metrics[f"coverage@{k}"] = len(recommended[k]) / len(catalog_items) if catalog_items else 0.0
+    metrics["rmse"] = float(np.sqrt(np.mean(squared_errors))) if squared_errors else None
+    return {
+        "metrics": metrics,
+        "users_evaluated": users_evaluated,
+        "rmse_pairs": len(squared_errors),
+        "performance": {
+            "build_seconds": build_seconds,
+            "build_peak_mb": build_peak,
+            "scoring_seconds": scoring_seconds,
+            "scoring_peak_mb": scoring_peak
+        }
+    }
+
+def _max_peak(peaks) -> float:
+    peaks = [peak for peak in peaks if peak is not None]
+    return max(peaks) if peaks else None
+
+def evaluate_metrics(items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame, ks: list = (5, 10),
+                     split: str = "kfold", n_folds: int = 5, test_fraction: float = 0.3,
+                     random_state: int = 42, backend: str = "dense", top_k: int = None,
+                     chunk_size: int = 1000, options: dict = None, measure_memory: bool = False) -> dict:
+    """
+    Gera o relatório de qualidade e desempenho do modelo, com as métricas médias entre as divisões
+    e os resultados de cada divisão. measure_memory=True mede o pico de memória com tracemalloc,
+    que rastreia o processo inteiro: use só fora da API (os picos ficam None sem ele).
+    """
+    ks = sorted(set(int(k) for k in ks))
+    folds = [
+        _evaluate_fold(items_df, train_df, test_df, ks, backend, top_k, chunk_size, options, measure_memory)
+        for train_df, test_df in split_ratings(ratings_df, split, n_folds, test_fraction, random_state)
+    ]
+
+    metric_names = {name for fold in folds for name in fold["metrics"]}
+    metrics = {}
+    for name in sorted(metric_names):
+        values = [fold["metrics"][name] for fold in folds if fold["metrics"].get(name) is not None]
+        metrics[name] = sum(values) / len(values) if values else None
+
+    return {
+        "split": split,
+        "folds": len(folds),
+        "ks": ks,
+        "backend": backend,
+        "options": options or {},
+        "metrics": metrics,
+        "users_evaluated": sum(fold["users_evaluated"] for fold in folds),
+        "performance": {
+            "build_seconds": sum(fold["performance"]["build_seconds"] for fold in folds),
+            "scoring_seconds": sum(fold["performance"]["scoring_seconds"] for fold in folds),
+            "build_peak_mb": _max_peak(fold["performance"]["build_peak_mb"] for fold in folds),
+            "scoring_peak_mb": _max_peak(fold["performance"]["scoring_peak_mb"] for fold in folds)
+        },
+        "per_fold": folds
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de métricas offline do recomendador.")
+    parser.add_argument("--ratings", default="ratings.csv", help="Arquivo de avaliações")
+    parser.add_argument("--items", default="items.csv", help="Arquivo de itens")
+    parser.add_argument("--split", choices=["kfold", "temporal"], default="kfold")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--test-fraction", type=float, default=0.3)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="dense")
+    parser.add_argument("--top-k", type=int, default=None, help="Vizinhos mantidos por item (backend esparso)")
+    parser.add_argument("--output", help="Grava o relatório em JSON neste arquivo")
+    add_als_arguments(parser)
+    args = parser.parse_args()
+
+    report = evaluate_metrics(
+        ItemCatalog.from_csv(args.items), RatingsStore(args.ratings).load(), ks=args.k, split=args.split,
+        n_folds=args.folds, test_fraction=args.test_fraction, backend=args.backend, top_k=args.top_k,
+        options=als_options(args) if args.backend == "als" else None, measure_memory=True
+    )
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
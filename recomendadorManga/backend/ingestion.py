@@ -0,0 +1,65 @@
+"""
+Ingestão de avaliações recebidas pela API.
+
+Os eventos são acumulados por uma janela curta (window_seconds) e gravados de
+uma vez: uma única escrita no log do RatingsStore e uma única leitura
+incremental pelo modelo, em vez de uma escrita e uma atualização por evento.
+Dentro da janela, várias notas do mesmo usuário para o mesmo item são
+coalescidas (vale a última).
+"""
+import threading
+
+from ratings_store import RatingsStore
+from recommender import RecommenderModel
+
+class RatingIngestor:
+    """
+    Fila de avaliações com gravação em lote no armazenamento e no modelo.
+    """
+
+    def __init__(self, store: RatingsStore, model: RecommenderModel,
+                 window_seconds: float = 0.05, max_batch: int = 1000):
+        self.store = store
+        self.model = model
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending = {}  # (user_id, item_id) -> rating, na ordem de chegada
+        self.submitted = 0  # avaliações recebidas desde o início (identifica o estado da fila)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # mantém a ordem das gravações
+        self._timer = None
+
+    def submit(self, ratings: list) -> int:
+        """
+        Enfileira avaliações (tuplas user_id, item_id, rating). Retorna quantas estão pendentes.
+        """
+        with self._lock:
+            for user_id, item_id, rating in ratings:
+                key = (int(user_id), int(item_id))
+                self._pending.pop(key, None)  # a nota mais recente vai para o fim da fila
+                self._pending[key] = int(rating)
+            self.submitted += len(ratings)
+            pending = len(self._pending)
+            if pending < self.max_batch and self._timer is None:
+                self._timer = threading.Timer(self.window_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if pending >= self.max_batch:
+            self.flush()
+        return pending
+
+    def flush(self) -> int:
+        """
+        Grava as avaliações pendentes e atualiza o modelo. Retorna quantas foram gravadas.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+            written = self.store.upsert_many((user_id, item_id, rating) for (user_id, item_id), rating in pending.items())
+        self.model.refresh()  # lê só o trecho novo do log e aplica incrementalmente
+        return written
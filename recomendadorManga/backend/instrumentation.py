@@ -0,0 +1,96 @@
+"""
+Instrumentação do caminho de recomendação com métricas Prometheus.
+
+Cada etapa (leitura das avaliações, montagem da matriz, similaridade,
+pontuação, seleção do top-N, metadados, cache) é medida com stage(), que
+registra a duração em um histograma por etapa. Dentro de profiling(), as
+durações também são acumuladas em um dicionário devolvido ao chamador, o que
+permite retornar o detalhamento de uma requisição específica.
+
+Tamanhos do modelo e contadores do cache são lidos no momento da coleta
+(ModelCollector), sem custo no caminho das requisições.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Etapas levam de microssegundos (metadados) a segundos (reconstrução completa)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+STAGE_SECONDS = Histogram(
+    "recommender_stage_seconds", "Duração de cada etapa do cálculo de recomendações",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "recommender_request_seconds", "Duração das requisições HTTP por rota",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+
+_profile = contextvars.ContextVar("recommender_profile", default=None)
+
+@contextmanager
+def stage(name: str):
+    """
+    Mede a duração do bloco como a etapa name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        profile = _profile.get()
+        if profile is not None:
+            profile[name] = profile.get(name, 0.0) + elapsed * 1000
+
+@contextmanager
+def profiling(enabled: bool = True):
+    """
+    Acumula, em um dicionário {etapa: milissegundos}, as etapas executadas dentro do bloco.
+    Com enabled=False não mede nada além dos histogramas e devolve None.
+    """
+    if not enabled:
+        yield None
+        return
+    profile = {}
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+class ModelCollector:
+    """
+    Coletor Prometheus com os tamanhos do modelo e os contadores do cache de recomendações.
+    """
+
+    def __init__(self, model, cache=None):
+        self.model = model
+        self.cache = cache
+
+    def collect(self):
+        sizes = GaugeMetricFamily("recommender_model_size", "Dimensões do modelo em memória", labels=["dimension"])
+        for dimension, value in self.model.sizes().items():
+            sizes.add_metric([dimension], value)
+        yield sizes
+
+        version = GaugeMetricFamily("recommender_model_version", "Versão dos dados do modelo")
+        version.add_metric([], self.model.version)
+        yield version
+
+        if self.cache is None:
+            return
+        stats = self.cache.stats()
+        for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            counter = CounterMetricFamily(f"recommender_cache_{name}", f"Cache de recomendações: {name}")
+            counter.add_metric([], stats[name])
+            yield counter
+        for name in ("entries", "hit_rate"):
+            gauge = GaugeMetricFamily(f"recommender_cache_{name}", f"Cache de recomendações: {name}")
+            gauge.add_metric([], stats[name])
+            yield gauge
@@ -0,0 +1,179 @@
+"""
+Índice de vizinhos mais próximos entre itens ("mangás parecidos com X").
+
+Guarda, para cada item, os top-k itens mais similares (similaridade cosseno
+entre as colunas da matriz usuário-item) em arquivos .npy, que são abertos
+com memory-map: carregar o índice não lê os arquivos inteiros, e vários
+processos compartilham as mesmas páginas.
+
+A construção exata processa os itens em blocos (memória limitada a
+block_size x itens). Para catálogos grandes há a construção aproximada com
+LSH por projeções aleatórias: só os itens que caem no mesmo bucket em alguma
+das tabelas são comparados.
+
+Uso:
+    python neighbors.py --output neighbors_index --k 20
+    python neighbors.py --output neighbors_index --method lsh --bits 12 --tables 8
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from array_files import load_arrays, read_meta, save_arrays, write_meta
+from ratings_store import RatingsStore
+from recommender import build_sparse_user_item_matrix, keep_top_k, normalize_rows, sparse_cosine_similarity
+
+INDEX_FILES = ("item_ids", "neighbors", "scores")
+DEFAULT_OPTIONS = {"k": 20, "method": "exact", "n_bits": 12, "n_tables": 8}
+
+def _neighbor_arrays(sim: sp.csr_matrix, item_ids: np.ndarray, k: int) -> tuple:
+    """
+    Converte a similaridade já podada (no máximo k entradas por linha, colunas na ordem de item_ids)
+    nos arrays do índice: vizinhos por similaridade decrescente, empates pelo menor item_id.
+    """
+    neighbors = np.full((len(item_ids), k), -1, dtype=np.int64)
+    scores = np.zeros((len(item_ids), k), dtype=np.float32)
+    for row in range(len(item_ids)):
+        start, end = sim.indptr[row], sim.indptr[row + 1]
+        columns, values = sim.indices[start:end], sim.data[start:end]
+        positive = values > 0
+        columns, values = columns[positive], values[positive]
+        order = np.lexsort((columns, -values))
+        neighbors[row, :len(order)] = item_ids[columns[order]]
+        scores[row, :len(order)] = values[order]
+    return neighbors, scores
+
+def _lsh_similarity(vectors: sp.csr_matrix, k: int, block_size: int, n_bits: int, n_tables: int,
+                    random_state: int) -> sp.csr_matrix:
+    """
+    Similaridade entre os itens (vetores já normalizados) só para os pares que caem no mesmo bucket
+    em alguma das tabelas, podada aos top-k de cada linha bloco a bloco.
+    """
+    n_items = vectors.shape[0]
+    rng = np.random.RandomState(random_state)
+    powers = 1 << np.arange(n_bits, dtype=np.int64)
+    buckets = []  # por tabela: (bucket de cada item, itens ordenados por bucket, início de cada bucket)
+    for _ in range(n_tables):
+        planes = rng.standard_normal((vectors.shape[1], n_bits))
+        keys = (np.asarray(vectors @ planes) > 0).astype(np.int64) @ powers
+        _, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        starts = np.searchsorted(inverse[order], np.arange(inverse.max() + 2))
+        buckets.append((inverse, order, starts))
+
+    blocks = []
+    for block_start in range(0, n_items, block_size):
+        rows = range(block_start, min(block_start + block_size, n_items))
+        columns, values = [], []
+        for row in rows:
+            candidates = np.unique(np.concatenate([
+                order[starts[inverse[row]]:starts[inverse[row] + 1]] for inverse, order, starts in buckets
+            ]))
+            candidates = candidates[candidates != row]
+            columns.append(candidates)
+            values.append((vectors[candidates] @ vectors[row].T).toarray().ravel())
+        indptr = np.concatenate([[0], np.cumsum([len(c) for c in columns])])
+        block = sp.csr_matrix((np.concatenate(values), np.concatenate(columns), indptr), shape=(len(rows), n_items))
+        block.eliminate_zeros()
+        blocks.append(keep_top_k(block, k))
+    return sp.vstack(blocks, format="csr")
+
+class NeighborIndex:
+    """
+    Top-k vizinhos de cada item: item_ids (ordenados), neighbors (IDs, -1 quando não há vizinho)
+    e scores (similaridade), com uma linha por item.
+    """
+
+    def __init__(self, item_ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray, meta: dict = None):
+        self.item_ids = item_ids
+        self.neighbors = neighbors
+        self.scores = scores
+        self.meta = meta or {}
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def similar(self, item_id: int, n: int = 10) -> list:
+        """
+        Retorna até n pares (item_id, score) dos itens mais similares ao item informado.
+        """
+        row = int(np.searchsorted(self.item_ids, item_id))
+        if row >= len(self.item_ids) or self.item_ids[row] != item_id:
+            return []  # item sem avaliações
+        neighbors, scores = self.neighbors[row, :n], self.scores[row, :n]
+        return [(int(item), float(score)) for item, score in zip(neighbors, scores) if item >= 0]
+
+    def save(self, directory: str):
+        """
+        Grava o índice; os arquivos são trocados atomicamente, para não corromper as páginas de
+        processos que estejam com o índice anterior mapeado.
+        """
+        save_arrays(directory, {name: getattr(self, name) for name in INDEX_FILES})
+        write_meta(directory, self.meta)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "NeighborIndex":
+        """
+        Abre um índice salvo; com mmap=True os arrays são mapeados em memória (somente leitura).
+        """
+        arrays = load_arrays(directory, INDEX_FILES, mmap_mode="r" if mmap else None)
+        return cls(arrays["item_ids"], arrays["neighbors"], arrays["scores"], read_meta(directory))
+
+def build_neighbor_index(ratings_df: pd.DataFrame, k: int = 20, method: str = "exact",
+                         block_size: int = 1024, n_bits: int = 12, n_tables: int = 8,
+                         random_state: int = 42) -> NeighborIndex:
+    """
+    Constrói o índice com os top-k vizinhos de cada item.
+    method="exact" compara todos os pares (em blocos); method="lsh" só compara itens que
+    colidem em alguma tabela de hash de projeções aleatórias (aproximado).
+    """
+    matrix, _, item_ids = build_sparse_user_item_matrix(ratings_df)
+    if method == "exact":
+        sim = sparse_cosine_similarity(matrix.T, top_k=k, block_size=block_size)
+        meta = {"k": k, "method": method}
+    elif method == "lsh":
+        sim = _lsh_similarity(normalize_rows(matrix.T), k, block_size, n_bits, n_tables, random_state)
+        meta = {"k": k, "method": method, "n_bits": n_bits, "n_tables": n_tables}
+    else:
+        raise ValueError(f"Método desconhecido: {method}")
+
+    neighbors, scores = _neighbor_arrays(sim, item_ids, k)
+    meta["n_items"] = len(item_ids)
+    return NeighborIndex(np.asarray(item_ids, dtype=np.int64), neighbors, scores, meta)
+
+def index_options(meta: dict = None, k: int = None, method: str = None, n_bits: int = None,
+                  n_tables: int = None) -> dict:
+    """
+    Parâmetros de construção do índice: os informados, senão os do índice salvo (meta), senão os padrões.
+    """
+    saved = meta or {}
+    requested = {"k": k, "method": method, "n_bits": n_bits, "n_tables": n_tables}
+    options = {
+        name: value if value is not None else saved.get(name, DEFAULT_OPTIONS[name])
+        for name, value in requested.items()
+    }
+    if options["method"] != "lsh":
+        del options["n_bits"], options["n_tables"]
+    return options
+
+def main():
+    parser = argparse.ArgumentParser(description="Constrói o índice de itens similares.")
+    parser.add_argument("--ratings", default="ratings.csv", help="Arquivo de avaliações")
+    parser.add_argument("--output", default="neighbors_index", help="Diretório do índice")
+    parser.add_argument("--k", type=int, default=20, help="Vizinhos guardados por item")
+    parser.add_argument("--method", choices=["exact", "lsh"], default="exact")
+    parser.add_argument("--bits", type=int, default=12, help="Bits por tabela (LSH)")
+    parser.add_argument("--tables", type=int, default=8, help="Número de tabelas (LSH)")
+    args = parser.parse_args()
+
+    ratings_df, position = RatingsStore(args.ratings).load_with_position()
+    index = build_neighbor_index(ratings_df, k=args.k, method=args.method, n_bits=args.bits, n_tables=args.tables)
+    index.meta["position"] = position  # avaliações gravadas depois disso no log não invalidam o índice
+    index.save(args.output)
+    print(f"Índice com {len(index.item_ids)} itens (k={args.k}, {args.method}) salvo em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Armazenamento das avaliações com escrita em log (append-only).
+
+O arquivo base (ratings.csv) não é reescrito a cada avaliação: cada upsert só
+acrescenta uma linha em um log ao lado dele (ratings.log.csv), com as mesmas
+colunas. Na leitura, uma linha do log substitui todas as linhas anteriores
+do mesmo par usuário/item por uma só (na posição da primeira) e nota 0 remove
+o par; um par removido que volta a ser avaliado entra no fim, como um par
+novo. Quando o log fica grande ele é incorporado ao arquivo base
+(compactação), sem mudar as avaliações vigentes.
+
+Todas as operações usam um lock de arquivo, então o backend e o frontend podem
+escrever ao mesmo tempo sem sobrescrever as avaliações um do outro.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+from filelock import FileLock
+
+COLUMNS = ["user_id", "item_id", "rating"]
+KEYS = ["user_id", "item_id"]
+
+def _empty_ratings() -> pd.DataFrame:
+    return pd.DataFrame({col: pd.Series(dtype=int) for col in COLUMNS})
+
+def _coerce(df: pd.DataFrame) -> pd.DataFrame:
+    for col in COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+    return df
+
+def _read_ratings_csv(path: str) -> pd.DataFrame:
+    """
+    Lê um CSV de avaliações garantindo IDs e notas inteiros; arquivo ausente ou vazio resulta em dataframe vazio.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return _empty_ratings()
+    return _coerce(pd.read_csv(path))
+
+def apply_log(base: pd.DataFrame, log: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica os eventos do log sobre as linhas base, com o mesmo resultado de aplicá-los um a um:
+    uma nota substitui todas as linhas do par por uma só, na posição da primeira; nota 0 remove
+    o par; um par sem linhas (novo ou removido antes) vai para o fim, na ordem em que voltou a
+    ser avaliado. Aplicar o log em partes sobre o resultado anterior dá o mesmo resultado.
+    """
+    if log.empty:
+        return base
+    events = log[COLUMNS].reset_index(drop=True)
+    events["position"] = np.arange(len(events))
+    events["deleted"] = events["position"].where(events["rating"] == 0, -1)
+    groups = events.groupby(KEYS, sort=False)
+    after_delete = events[events["position"] > groups["deleted"].transform("max")]
+    pairs = groups.agg(rating=("rating", "last"), last_delete=("deleted", "max"))
+    pairs["first_after"] = after_delete.groupby(KEYS)["position"].min()  # quando o par (re)entrou
+
+    # Linhas base: pares removidos no log saem; pares só atualizados ficam com uma linha e a nota nova
+    base_keys = pd.MultiIndex.from_frame(base[KEYS])
+    matched = pairs.reindex(base_keys)
+    in_log = matched["rating"].notna().to_numpy()
+    kept = ~in_log | ((matched["last_delete"].to_numpy() < 0) & ~base_keys.duplicated())
+    merged = base[kept].copy()
+    override = matched["rating"].to_numpy()[kept]
+    merged["rating"] = np.where(np.isnan(override), merged["rating"], override).astype(int)
+
+    appended = pairs[(~pairs.index.isin(base_keys) | (pairs["last_delete"] >= 0)) & (pairs["rating"] != 0)]
+    appended = appended.sort_values("first_after").reset_index()
+    return pd.concat([merged, appended[COLUMNS]], ignore_index=True)
+
+class RatingsStore:
+    """
+    Avaliações em um arquivo base + log de escrita com compactação periódica.
+    Uma escrita custa O(1) (uma linha no log) em vez de reescrever o CSV inteiro.
+    """
+
+    def __init__(self, path: str, log_path: str = None, max_log_bytes: int = 1_000_000):
+        self.path = path
+        self.log_path = log_path or os.path.splitext(path)[0] + ".log.csv"
+        self.max_log_bytes = max_log_bytes
+        self._lock = FileLock(path + ".lock")
+
+    def signature(self) -> tuple:
+        """
+        Identifica o estado atual dos arquivos; muda a cada escrita ou compactação.
+        """
+        result = []
+        for path in (self.path, self.log_path):
+            try:
+                stat = os.stat(path)
+                result.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                result.append(None)
+        return tuple(result)
+
+    def load(self) -> pd.DataFrame:
+        """
+        Retorna todas as avaliações vigentes (arquivo base com o log aplicado).
+        """
+        with self._lock:
+            return apply_log(_read_ratings_csv(self.path), _read_ratings_csv(self.log_path))
+
+    def _position_locked(self) -> tuple:
+        base = os.stat(self.path) if os.path.exists(self.path) else None
+        base_signature = (base.st_mtime_ns, base.st_size, base.st_ino) if base else None
+        try:
+            log = os.stat(self.log_path)
+            return (base_signature, log.st_ino, log.st_size)
+        except FileNotFoundError:
+            return (base_signature, None, 0)
+
+    def load_with_position(self) -> tuple:
+        """
+        Retorna (avaliações vigentes, posição), onde a posição marca até onde o log foi lido
+        e pode ser passada a changes_since() para ler só os eventos novos.
+        """
+        with self._lock:
+            ratings = apply_log(_read_ratings_csv(self.path), _read_ratings_csv(self.log_path))
+            return ratings, self._position_locked()
+
+    def changes_since(self, position: tuple) -> tuple:
+        """
+        Retorna (eventos, nova posição) com os eventos gravados no log depois de position, na ordem de escrita.
+        Se o arquivo base mudou (compactação ou escrita externa), retorna (None, nova posição):
+        nesse caso é preciso recarregar tudo com load_with_position().
+        """
+        with self._lock:
+            current = self._position_locked()
+            base_signature, log_id, offset = position
+            if current[0] != base_signature or (current[1] != log_id and offset > 0) or current[2] < offset:
+                return None, current
+            if current[2] == offset:
+                return _empty_ratings(), current
+
+            with open(self.log_path, "r", encoding="utf-8", newline="") as f:
+                f.seek(offset)
+                text = f.read()
+        events = pd.read_csv(io.StringIO(text), header=0 if offset == 0 else None, names=COLUMNS)
+        return _coerce(events), current
+
+    def upsert_many(self, ratings: list) -> int:
+        """
+        Insere ou atualiza várias avaliações (tuplas user_id, item_id, rating) com uma única escrita.
+        Nota 0 remove a avaliação. Retorna a quantidade de eventos gravados.
+        """
+        lines = "".join(f"{int(user_id)},{int(item_id)},{int(rating)}\n" for user_id, item_id, rating in ratings)
+        if not lines:
+            return 0
+        with self._lock:
+            write_header = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
+            with open(self.log_path, "a", encoding="utf-8", newline="") as f:
+                if write_header:
+                    f.write(",".join(COLUMNS) + "\n")
+                f.write(lines)
+                log_size = f.tell()
+            if log_size > self.max_log_bytes:
+                self._compact_locked()
+        return lines.count("\n")
+
+    def upsert(self, user_id: int, item_id: int, rating: int):
+        """
+        Insere ou atualiza a avaliação de um usuário para um item.
+        """
+        self.upsert_many([(user_id, item_id, rating)])
+
+    def delete(self, user_id: int, item_id: int):
+        """
+        Remove a avaliação de um usuário para um item.
+        """
+        self.upsert_many([(user_id, item_id, 0)])
+
+    def compact(self):
+        """
+        Incorpora o log ao arquivo base e esvazia o log.
+        """
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        merged = apply_log(_read_ratings_csv(self.path), _read_ratings_csv(self.log_path))
+        tmp_path = self.path + ".tmp"
+        merged.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)  # troca atômica: leitores nunca veem o arquivo pela metade
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
@@ -1,5 +1,13 @@
+import threading
+
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+
+from als import als_fit, solve_factors
+from catalog import ItemCatalog, as_catalog
+from instrumentation import stage
+from ratings_store import RatingsStore, apply_log
 
 def cosine_similarity_matrix(mat: np.ndarray) -> np.ndarray:
     """
@@ -11,68 +19,861 @@ def cosine_similarity_matrix(mat: np.ndarray) -> np.ndarray:
     normalized = mat / norms[:, None]
     return normalized @ normalized.T  # produto escalar para similaridade
 
-def build_user_item_matrix(ratings_df: pd.DataFrame) -> pd.DataFrame:
+def _coerce_ratings(ratings_df: pd.DataFrame) -> pd.DataFrame:
     """
-    Constrói a matriz usuário-item a partir do dataframe de avaliações.
-    Valores ausentes são preenchidos com 0.
+    Garante que IDs e ratings sejam inteiros (altera o dataframe recebido).
     """
-    # Garantir que IDs e ratings sejam inteiros
     ratings_df["user_id"] = pd.to_numeric(ratings_df["user_id"], errors="coerce").fillna(0).astype(int)
     ratings_df["item_id"] = pd.to_numeric(ratings_df["item_id"], errors="coerce").fillna(0).astype(int)
     ratings_df["rating"] = pd.to_numeric(ratings_df["rating"], errors="coerce").fillna(0).astype(int)
+    return ratings_df
 
+def build_user_item_matrix(ratings_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Constrói a matriz usuário-item a partir do dataframe de avaliações.
+    Valores ausentes são preenchidos com 0.
+    """
+    _coerce_ratings(ratings_df)
     return ratings_df.pivot_table(index='user_id', columns='item_id', values='rating', fill_value=0)
 
-def get_recommendations(user_id: int, items_df: pd.DataFrame, ratings_df: pd.DataFrame) -> list:
+def _group_ratings(ratings_df: pd.DataFrame) -> tuple:
     """
-    Gera 5 recomendações de itens para um usuário usando filtragem colaborativa baseada em itens.
+    Agrega as avaliações por par usuário/item (média, como no pivot_table).
+    Retorna (notas, linhas, colunas, user_ids, item_ids), com os IDs ordenados.
     """
-    ui_matrix = build_user_item_matrix(ratings_df)
+    _coerce_ratings(ratings_df)
+    grouped = ratings_df.groupby(["user_id", "item_id"])["rating"].mean()
 
-    if user_id not in ui_matrix.index:
-        return []  # usuário não possui avaliações
+    user_ids, rows = np.unique(grouped.index.get_level_values("user_id").to_numpy(), return_inverse=True)
+    item_ids, cols = np.unique(grouped.index.get_level_values("item_id").to_numpy(), return_inverse=True)
+    return grouped.to_numpy(dtype=np.float64), rows, cols, user_ids, item_ids
+
+def build_sparse_user_item_matrix(ratings_df: pd.DataFrame) -> tuple:
+    """
+    Constrói a matriz usuário-item esparsa (CSR) a partir do dataframe de avaliações.
+    Avaliações repetidas do mesmo par usuário/item são agregadas pela média, como no pivot_table.
+    Retorna (matriz, user_ids, item_ids), com os IDs ordenados na mesma ordem das linhas/colunas.
+    """
+    values, rows, cols, user_ids, item_ids = _group_ratings(ratings_df)
+    matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(user_ids), len(item_ids)))
+    matrix.eliminate_zeros()  # nota 0 equivale a "não avaliado"
+    return matrix, user_ids, item_ids
+
+def sparse_cosine_similarity(mat: sp.csr_matrix, top_k: int = None, block_size: int = 1024) -> sp.csr_matrix:
+    """
+    Calcula a similaridade cosseno entre as linhas de uma matriz esparsa.
+    Se top_k for informado, mantém apenas os top_k vizinhos mais similares de cada linha; o produto
+    é calculado em blocos de block_size linhas, podados antes de serem empilhados, então a memória
+    fica limitada a block_size x linhas em vez do produto completo.
+    A diagonal é descartada, pois um item nunca é usado para prever a própria nota.
+    """
+    mat = normalize_rows(mat)
+    mat_t = mat.T.tocsc()
+
+    if top_k is None:
+        return _without_diagonal((mat @ mat_t).tocsr(), 0)
 
+    blocks = []
+    for start in range(0, mat.shape[0], block_size):
+        block = _without_diagonal((mat[start:start + block_size] @ mat_t).tocsr(), start)
+        blocks.append(keep_top_k(block, top_k))
+    if not blocks:
+        return sp.csr_matrix((0, 0))
+    return sp.vstack(blocks, format="csr")
+
+def normalize_rows(mat: sp.csr_matrix) -> sp.csr_matrix:
+    """
+    Cópia CSR (float64) da matriz com cada linha dividida pela sua norma; linhas vazias ficam vazias.
+    """
+    mat = sp.csr_matrix(mat, dtype=np.float64, copy=True)
+    norms = np.sqrt(np.asarray(mat.multiply(mat).sum(axis=1)).ravel())
+    norms[norms == 0] = 1e-9  # evita divisão por zero
+    mat.data /= np.repeat(norms, np.diff(mat.indptr))
+    return mat
+
+def _without_diagonal(block: sp.csr_matrix, start: int) -> sp.csr_matrix:
+    """
+    Zera as entradas (linha, start + linha) de um bloco de linhas da similaridade (a diagonal).
+    """
+    block.setdiag(0, k=start)
+    block.eliminate_zeros()
+    return block
+
+def keep_top_k(sim: sp.csr_matrix, top_k: int) -> sp.csr_matrix:
+    """
+    Mantém apenas os top_k maiores valores de cada linha da matriz esparsa.
+    Empates no último lugar ficam com as menores colunas.
+    """
+    pruned = sim.copy()
+    pruned.sort_indices()
+    indptr, data = pruned.indptr, pruned.data
+    keep = np.ones(len(data), dtype=bool)
+    for row in range(pruned.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if end - start <= top_k:
+            continue
+        row_data = data[start:end]
+        kth = np.partition(row_data, end - start - top_k)[end - start - top_k]
+        above = row_data > kth
+        ties = np.flatnonzero(row_data == kth)[:top_k - int(above.sum())]
+        keep[start:end] = above
+        keep[start + ties] = True
+
+    pruned.data[~keep] = 0
+    pruned.eliminate_zeros()
+    return pruned
+
+def build_item_similarity(ui_matrix: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula a matriz de similaridade item-item a partir da matriz usuário-item.
+    Linhas e colunas são indexadas pelos IDs dos itens.
+    """
     item_matrix = ui_matrix.T.values
     sim_matrix = cosine_similarity_matrix(item_matrix)
-    item_sim = pd.DataFrame(sim_matrix, index=ui_matrix.columns, columns=ui_matrix.columns)
-
-    preds = {}
-    for item in ui_matrix.columns:
-        if ui_matrix.loc[user_id, item] != 0:
-            continue  # usuário já avaliou este item
+    return pd.DataFrame(sim_matrix, index=ui_matrix.columns, columns=ui_matrix.columns)
 
-        sims = item_sim[item]
-        rated_mask = ui_matrix.loc[user_id] != 0
-        weights = sims[rated_mask.index[rated_mask]]
-        ratings = ui_matrix.loc[user_id, rated_mask]
+def score_items(ratings: np.ndarray, item_sim, abs_sim=None) -> np.ndarray:
+    """
+    Calcula a nota prevista de todos os itens para um usuário com um único produto matriz-vetor.
+    ratings é o vetor de notas do usuário (0 = não avaliado) e item_sim a matriz de
+    similaridade itens x itens (densa ou esparsa). abs_sim pode ser passado já calculado.
+    """
+    rated_mask = ratings != 0
+    if abs_sim is None:
+        abs_sim = abs(item_sim)
+    numerator = item_sim @ ratings
+    denominator = abs_sim @ rated_mask.astype(np.float64)
+    return numerator / (denominator + 1e-9)
 
-        if len(weights) == 0:
-            continue  # nenhum item similar avaliado
+def select_top_n(scores: np.ndarray, top_n: int, keys: np.ndarray = None) -> np.ndarray:
+    """
+    Retorna os índices dos top_n maiores scores em ordem decrescente, sem ordenar o vetor inteiro.
+    Empates são resolvidos pelo menor valor de keys (por padrão, o menor índice),
+    como na ordenação estável do sorted().
+    """
+    if top_n <= 0 or len(scores) == 0:
+        return np.array([], dtype=int)
+    if len(scores) > top_n:
+        kth = len(scores) - top_n
+        threshold = np.partition(scores, kth)[kth]
+        idx = np.flatnonzero(scores >= threshold)
+    else:
+        idx = np.arange(len(scores))
+    order = np.lexsort((idx if keys is None else keys[idx], -scores[idx]))[:top_n]
+    return idx[order]
 
-        score = (weights * ratings).sum() / (np.abs(weights).sum() + 1e-9)
-        preds[item] = score
+def score_users(ratings_block: np.ndarray, item_sim, abs_sim=None) -> np.ndarray:
+    """
+    Versão em lote de score_items: calcula as notas previstas de vários usuários de uma vez
+    (uma linha de ratings_block por usuário) com um produto matriz-matriz.
+    """
+    rated_mask = (ratings_block != 0).astype(np.float64)
+    if abs_sim is None:
+        abs_sim = abs(item_sim)
+    numerator = np.asarray(item_sim @ ratings_block.T).T
+    denominator = np.asarray(abs_sim @ rated_mask.T).T
+    return numerator / (denominator + 1e-9)
 
-    # Seleciona os 5 top itens
-    top_n = 5
-    top_items = sorted(preds.items(), key=lambda x: x[1], reverse=True)[:top_n]
+def _similarity_scores(block: np.ndarray, item_sim, abs_sim) -> np.ndarray:
+    """
+    Scores item-item de um bloco de usuários (um produto matriz-vetor quando há um único usuário).
+    """
+    if len(block) == 1:
+        return score_items(block[0], item_sim, abs_sim)[None, :]
+    return score_users(block, item_sim, abs_sim)
 
+def _format_results(item_ids: np.ndarray, scores: np.ndarray, items_df: ItemCatalog | pd.DataFrame) -> list:
+    """
+    Monta a lista de recomendações com os metadados de cada item (busca em O(1) no catálogo).
+    """
+    catalog = as_catalog(items_df)
+    titles, categories = catalog.column("title"), catalog.column("category")
     results = []
-    for item_id, score in top_items:
-        row = items_df[items_df['item_id'] == item_id]
-        if not row.empty:
+    for item_id, score in zip(item_ids.tolist(), scores):
+        row = catalog.row(item_id)
+        if row is not None:
             results.append({
-                "item_id": int(item_id),
-                "title": row['title'].values[0],
-                "category": row['category'].values[0],
+                "item_id": item_id,
+                "title": titles[row],
+                "category": categories[row],
                 "score": float(score)
             })
 
     return results
 
-def evaluate_accuracy(user_id: int, items_df: pd.DataFrame, ratings_df: pd.DataFrame) -> dict:
+def _select_top(ratings: np.ndarray, scores: np.ndarray, item_ids: np.ndarray,
+                top_n: int, available: np.ndarray = None):
+    """
+    Posições dos top_n itens não avaliados, ou None se o usuário não avaliou nenhum item.
+    available marca os itens que ainda têm avaliações (None = todos).
+    """
+    rated_mask = ratings != 0
+    if not rated_mask.any():
+        return None  # nenhum item similar avaliado
+
+    candidate_mask = ~rated_mask if available is None else ~rated_mask & available
+    candidates = np.flatnonzero(candidate_mask)  # usuário já avaliou os demais itens
+    return candidates[select_top_n(scores[candidates], top_n, item_ids[candidates])]
+
+def _top_recommendations(ratings: np.ndarray, scores: np.ndarray, item_ids: np.ndarray,
+                         items_df: ItemCatalog | pd.DataFrame, top_n: int, available: np.ndarray = None) -> list:
+    """
+    Seleciona os top_n itens não avaliados a partir dos scores já calculados.
+    """
+    top = _select_top(ratings, scores, item_ids, top_n, available)
+    if top is None:
+        return []
+    return _format_results(item_ids[top], scores[top], items_df)
+
+def _recommend_vector(ratings: np.ndarray, item_ids: np.ndarray, item_sim, items_df: ItemCatalog | pd.DataFrame,
+                      top_n: int, abs_sim=None) -> list:
+    """
+    Pontua os itens não avaliados a partir do vetor de notas do usuário e monta a lista de resultados.
+    """
+    if not (ratings != 0).any():
+        return []  # nenhum item similar avaliado
+
+    scores = score_items(ratings, item_sim, abs_sim)
+    return _top_recommendations(ratings, scores, item_ids, items_df, top_n)
+
+def recommend_from_matrices(user_id: int, items_df: ItemCatalog | pd.DataFrame, ui_matrix: pd.DataFrame,
+                            item_sim: pd.DataFrame, top_n: int = 5, abs_sim=None) -> list:
+    """
+    Gera as recomendações de um usuário a partir de matrizes já construídas.
+    """
+    if user_id not in ui_matrix.index:
+        return []  # usuário não possui avaliações
+
+    ratings = ui_matrix.loc[user_id].to_numpy(dtype=np.float64)
+    return _recommend_vector(ratings, ui_matrix.columns.to_numpy(), item_sim.to_numpy(), items_df, top_n, abs_sim)
+
+def get_recommendations(user_id: int, items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame) -> list:
+    """
+    Gera 5 recomendações de itens para um usuário usando filtragem colaborativa baseada em itens.
+    """
+    with stage("build_matrix"):
+        ui_matrix = build_user_item_matrix(ratings_df)
+
+    if user_id not in ui_matrix.index:
+        return []  # usuário não possui avaliações
+
+    with stage("similarity"):
+        item_sim = build_item_similarity(ui_matrix)
+    return recommend_from_matrices(user_id, items_df, ui_matrix, item_sim)
+
+def _safe_norms(squared_norms: np.ndarray) -> np.ndarray:
+    norms = np.sqrt(np.maximum(squared_norms, 0))
+    norms[norms == 0] = 1e-9  # evita divisão por zero
+    return norms
+
+class DenseItemModel:
+    """
+    Estado do backend denso, com atualização incremental.
+    Mantém a matriz usuário-item, os produtos escalares entre itens (X^T X) e as normas dos itens,
+    de modo que uma avaliação nova só recalcula a linha/coluna do item afetado: O(usuários + itens).
+    Os buffers têm capacidade extra para que novos usuários/itens não exijam realocar tudo a cada evento.
+    """
+
+    incremental = True
+
+    def __init__(self, ratings_df: pd.DataFrame):
+        with stage("build_matrix"):
+            values, rows, cols, user_ids, item_ids = _group_ratings(ratings_df)
+            n_users, n_items = len(user_ids), len(item_ids)
+
+            self.user_ids = [int(user) for user in user_ids]
+            self.user_index = {user: idx for idx, user in enumerate(self.user_ids)}
+            self.item_index = {int(item): idx for idx, item in enumerate(item_ids)}
+            self._item_ids = np.asarray(item_ids, dtype=np.int64)
+
+            self._ratings = np.zeros((n_users, n_items))
+            self._ratings[rows, cols] = values
+            # Pares presentes nas avaliações (inclusive com nota 0), para saber quais usuários/itens existem
+            self._present = np.zeros((n_users, n_items), dtype=bool)
+            self._present[rows, cols] = True
+            self._user_counts = self._present.sum(axis=1)
+            self._item_counts = self._present.sum(axis=0)
+
+        with stage("similarity"):
+            self._gram = self._ratings.T @ self._ratings
+            self._norms = _safe_norms(np.diag(self._gram).copy())
+            self._sim = self._gram / np.outer(self._norms, self._norms)
+            self._abs_sim = np.abs(self._sim)
+
+    def sizes(self) -> dict:
+        return {
+            "users": len(self.user_ids),
+            "items": self.n_items,
+            "ratings": int(self._user_counts[:len(self.user_ids)].sum()),
+            "similarity_entries": self.n_items * self.n_items,
+        }
+
+    def arrays(self) -> dict:
+        """
+        Arrays que descrevem o estado (sem a capacidade extra dos buffers), para gravação em snapshot.
+        """
+        n_users, n_items = len(self.user_ids), self.n_items
+        return {
+            "user_ids": np.asarray(self.user_ids, dtype=np.int64),
+            "item_ids": self.item_ids,
+            "ratings": self._ratings[:n_users, :n_items],
+            "present": self._present[:n_users, :n_items],
+            "user_counts": self._user_counts[:n_users],
+            "item_counts": self._item_counts[:n_items],
+            "gram": self._gram[:n_items, :n_items],
+            "norms": self._norms[:n_items],
+            "sim": self.sim,
+            "abs_sim": self.abs_sim,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "DenseItemModel":
+        """
+        Reconstrói o estado a partir de arrays gravados por arrays(), sem recalcular nada.
+        Os arrays podem ser memory-maps em modo cópia-na-escrita: só as páginas alteradas
+        por avaliações novas deixam de ser compartilhadas.
+        """
+        model = cls.__new__(cls)
+        model.user_ids = [int(user) for user in arrays["user_ids"]]
+        model.user_index = {user: idx for idx, user in enumerate(model.user_ids)}
+        model.item_index = {int(item): idx for idx, item in enumerate(arrays["item_ids"])}
+        model._item_ids = arrays["item_ids"]
+        model._ratings = arrays["ratings"]
+        model._present = arrays["present"]
+        model._user_counts = arrays["user_counts"]
+        model._item_counts = arrays["item_counts"]
+        model._gram = arrays["gram"]
+        model._norms = arrays["norms"]
+        model._sim = arrays["sim"]
+        model._abs_sim = arrays["abs_sim"]
+        return model
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_index)
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        return self._item_ids[:self.n_items]
+
+    @property
+    def sim(self) -> np.ndarray:
+        return self._sim[:self.n_items, :self.n_items]
+
+    @property
+    def abs_sim(self) -> np.ndarray:
+        return self._abs_sim[:self.n_items, :self.n_items]
+
+    @property
+    def available(self) -> np.ndarray:
+        return self._item_counts[:self.n_items] > 0
+
+    def active_users(self) -> list:
+        return [user for user in self.user_ids if self._user_counts[self.user_index[user]] > 0]
+
+    def has_user(self, user_id: int) -> bool:
+        idx = self.user_index.get(user_id)
+        return idx is not None and self._user_counts[idx] > 0
+
+    def user_block(self, user_ids: list) -> np.ndarray:
+        return self._ratings[[self.user_index[user] for user in user_ids], :self.n_items]
+
+    def score(self, user_ids: list, block: np.ndarray) -> np.ndarray:
+        return _similarity_scores(block, self.sim, self.abs_sim)
+
+    def _grow(self, n_users: int, n_items: int):
+        # Só os buffers da dimensão que estourou a capacidade são realocados: um usuário novo não
+        # copia as matrizes itens x itens (que podem ser memory-maps compartilhados entre workers)
+        cap_users, cap_items = self._ratings.shape[0], self._gram.shape[0]
+        grow_users, grow_items = n_users > cap_users, n_items > cap_items
+        if not grow_users and not grow_items:
+            return
+        new_users = max(n_users, 2 * cap_users) if grow_users else cap_users
+        new_items = max(n_items, 2 * cap_items) if grow_items else cap_items
+
+        def resized(buffer, shape, fill=0):
+            out = np.full(shape, fill, dtype=buffer.dtype)
+            out[tuple(slice(0, dim) for dim in buffer.shape)] = buffer
+            return out
+
+        self._ratings = resized(self._ratings, (new_users, new_items))
+        self._present = resized(self._present, (new_users, new_items))
+        if grow_users:
+            self._user_counts = resized(self._user_counts, (new_users,))
+        if grow_items:
+            self._item_counts = resized(self._item_counts, (new_items,))
+            self._item_ids = resized(self._item_ids, (new_items,))
+            self._gram = resized(self._gram, (new_items, new_items))
+            self._norms = resized(self._norms, (new_items,), 1e-9)
+            self._sim = resized(self._sim, (new_items, new_items))
+            self._abs_sim = resized(self._abs_sim, (new_items, new_items))
+
+    def _ensure_user(self, user_id: int) -> int:
+        if user_id not in self.user_index:
+            self._grow(len(self.user_ids) + 1, self.n_items)
+            self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return self.user_index[user_id]
+
+    def _ensure_item(self, item_id: int) -> int:
+        if item_id not in self.item_index:
+            idx = self.n_items
+            self._grow(len(self.user_ids), idx + 1)
+            self._item_ids[idx] = item_id
+            self.item_index[item_id] = idx
+        return self.item_index[item_id]
+
+    def apply(self, user_id: int, item_id: int, rating: int):
+        """
+        Aplica a inserção/atualização (ou remoção, com nota 0) da avaliação de um usuário para um item.
+        Só a linha/coluna do item na matriz de co-avaliações e na similaridade é recalculada.
+        """
+        if rating == 0 and (user_id not in self.user_index or item_id not in self.item_index):
+            return  # remoção de um par que não existe
+        u = self._ensure_user(user_id)
+        i = self._ensure_item(item_id)
+        n = self.n_items
+
+        user_row = self._ratings[u, :n]
+        old, new = user_row[i], float(rating)
+        if old != new:
+            gram = self._gram
+            gram_ii = gram[i, i] - old * old + new * new
+            gram[i, :n] += (new - old) * user_row  # produtos escalares com os demais itens
+            gram[i, i] = gram_ii
+            gram[:n, i] = gram[i, :n]
+            user_row[i] = new
+
+            self._norms[i] = _safe_norms(np.array([gram_ii]))[0]
+            sim_row = gram[i, :n] / (self._norms[i] * self._norms[:n])
+            self._sim[i, :n] = sim_row
+            self._sim[:n, i] = sim_row
+            self._abs_sim[i, :n] = np.abs(sim_row)
+            self._abs_sim[:n, i] = self._abs_sim[i, :n]
+
+        present = rating != 0
+        if present != self._present[u, i]:
+            step = 1 if present else -1
+            self._present[u, i] = present
+            self._user_counts[u] += step
+            self._item_counts[i] += step
+
+    def apply_events(self, events: pd.DataFrame):
+        """
+        Aplica os eventos (user_id, item_id, rating) na ordem recebida, um a um.
+        """
+        for user_id, item_id, rating in events[["user_id", "item_id", "rating"]].itertuples(index=False):
+            self.apply(int(user_id), int(item_id), int(rating))
+
+class SparseItemModel:
+    """
+    Estado do backend esparso (CSR), opcionalmente com só os top_k vizinhos por item.
+    Não tem atualização incremental: a poda top_k não pode ser mantida exatamente evento a evento.
+    """
+
+    incremental = False
+
+    def __init__(self, ratings_df: pd.DataFrame, top_k: int = None):
+        with stage("build_matrix"):
+            self.matrix, user_ids, self.item_ids = build_sparse_user_item_matrix(ratings_df)
+            self.user_ids = [int(user) for user in user_ids]
+            self.user_index = {user: idx for idx, user in enumerate(self.user_ids)}
+        with stage("similarity"):
+            self.sim = sparse_cosine_similarity(self.matrix.T, top_k)
+            self.abs_sim = abs(self.sim)
+        self.available = None
+
+    def sizes(self) -> dict:
+        return {
+            "users": self.matrix.shape[0],
+            "items": self.matrix.shape[1],
+            "ratings": self.matrix.nnz,
+            "similarity_entries": self.sim.nnz,
+        }
+
+    def arrays(self) -> dict:
+        """
+        Arrays que descrevem o estado (matrizes CSR desmontadas), para gravação em snapshot.
+        """
+        arrays = {"user_ids": np.asarray(self.user_ids, dtype=np.int64), "item_ids": np.asarray(self.item_ids, dtype=np.int64)}
+        for name in ("matrix", "sim", "abs_sim"):
+            matrix = getattr(self, name)
+            arrays.update({
+                f"{name}_data": matrix.data, f"{name}_indices": matrix.indices,
+                f"{name}_indptr": matrix.indptr, f"{name}_shape": np.asarray(matrix.shape, dtype=np.int64)
+            })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "SparseItemModel":
+        """
+        Reconstrói o estado a partir de arrays gravados por arrays(), sem recalcular nada.
+        """
+        model = cls.__new__(cls)
+        model.user_ids = [int(user) for user in arrays["user_ids"]]
+        model.user_index = {user: idx for idx, user in enumerate(model.user_ids)}
+        model.item_ids = arrays["item_ids"]
+        for name in ("matrix", "sim", "abs_sim"):
+            setattr(model, name, sp.csr_matrix(
+                (arrays[f"{name}_data"], arrays[f"{name}_indices"], arrays[f"{name}_indptr"]),
+                shape=tuple(int(dim) for dim in arrays[f"{name}_shape"])
+            ))
+        model.available = None
+        return model
+
+    def active_users(self) -> list:
+        return list(self.user_ids)
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self.user_index
+
+    def user_block(self, user_ids: list) -> np.ndarray:
+        return self.matrix[[self.user_index[user] for user in user_ids]].toarray()
+
+    def score(self, user_ids: list, block: np.ndarray) -> np.ndarray:
+        return _similarity_scores(block, self.sim, self.abs_sim)
+
+class FactorModel:
+    """
+    Estado do backend "als": fatoração U V^T da matriz usuário-item treinada por ALS (als.py).
+    Guarda a matriz de avaliações (CSR) e os fatores, (usuários + itens) x fatores, sem nenhuma
+    matriz itens x itens; os scores de um usuário são um único produto U[u] @ V^T.
+    Avaliações novas recalculam só os fatores dos usuários afetados, com os fatores dos itens fixos
+    (fold-in); itens que ainda não estão no modelo entram na próxima construção completa.
+    """
+
+    incremental = True
+
+    def __init__(self, ratings_df: pd.DataFrame, factors: int = 32, regularization: float = 0.1,
+                 iterations: int = 10, alpha: float = 10.0, implicit: bool = False, threads: int = 0):
+        with stage("build_matrix"):
+            self.matrix, user_ids, self.item_ids = build_sparse_user_item_matrix(ratings_df)
+            self.user_ids = [int(user) for user in user_ids]
+            self.user_index = {user: idx for idx, user in enumerate(self.user_ids)}
+        self.regularization, self.alpha, self.implicit = float(regularization), float(alpha), bool(implicit)
+        with stage("factorization"):
+            self.user_factors, self.item_factors = als_fit(
+                self.matrix, factors, regularization, iterations, alpha, implicit, threads
+            )
+        self.available = None
+
+    def sizes(self) -> dict:
+        return {
+            "users": self.matrix.shape[0],
+            "items": self.matrix.shape[1],
+            "ratings": self.matrix.nnz,
+            "factor_entries": self.user_factors.size + self.item_factors.size,
+        }
+
+    def arrays(self) -> dict:
+        """
+        Arrays que descrevem o estado (matriz CSR desmontada, fatores e parâmetros do fold-in), para gravação em snapshot.
+        """
+        return {
+            "user_ids": np.asarray(self.user_ids, dtype=np.int64),
+            "item_ids": np.asarray(self.item_ids, dtype=np.int64),
+            "matrix_data": self.matrix.data, "matrix_indices": self.matrix.indices,
+            "matrix_indptr": self.matrix.indptr, "matrix_shape": np.asarray(self.matrix.shape, dtype=np.int64),
+            "user_factors": self.user_factors,
+            "item_factors": self.item_factors,
+            "params": np.array([self.regularization, self.alpha, float(self.implicit)]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "FactorModel":
+        """
+        Reconstrói o estado a partir de arrays gravados por arrays(), sem treinar de novo.
+        """
+        model = cls.__new__(cls)
+        model.user_ids = [int(user) for user in arrays["user_ids"]]
+        model.user_index = {user: idx for idx, user in enumerate(model.user_ids)}
+        model.item_ids = arrays["item_ids"]
+        model.matrix = sp.csr_matrix(
+            (arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]),
+            shape=tuple(int(dim) for dim in arrays["matrix_shape"])
+        )
+        model.user_factors, model.item_factors = arrays["user_factors"], arrays["item_factors"]
+        regularization, alpha, implicit = arrays["params"]
+        model.regularization, model.alpha, model.implicit = float(regularization), float(alpha), bool(implicit)
+        model.available = None
+        return model
+
+    def active_users(self) -> list:
+        counts = np.diff(self.matrix.indptr)
+        return [user for user, count in zip(self.user_ids, counts) if count]
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self.user_index
+
+    def user_block(self, user_ids: list) -> np.ndarray:
+        return self.matrix[[self.user_index[user] for user in user_ids]].toarray()
+
+    def score(self, user_ids: list, block: np.ndarray) -> np.ndarray:
+        return self.user_factors[[self.user_index[user] for user in user_ids]] @ self.item_factors.T
+
+    def apply_events(self, events: pd.DataFrame):
+        """
+        Aplica os eventos (user_id, item_id, rating; nota 0 remove) e refaz o fold-in dos usuários afetados.
+        """
+        latest = events.drop_duplicates(["user_id", "item_id"], keep="last")
+        item_ids = latest["item_id"].to_numpy(dtype=np.int64)
+        cols = np.minimum(np.searchsorted(self.item_ids, item_ids), len(self.item_ids) - 1)
+        known = self.item_ids[cols] == item_ids  # itens fora do modelo ficam para a próxima construção
+        if not known.any():
+            return
+
+        new_users = [int(user) for user in latest["user_id"].unique() if int(user) not in self.user_index]
+        if new_users:
+            for user in new_users:
+                self.user_index[user] = len(self.user_ids)
+                self.user_ids.append(user)
+            self.matrix = sp.vstack([self.matrix, sp.csr_matrix((len(new_users), self.matrix.shape[1]))], format="csr")
+            self.user_factors = np.vstack([self.user_factors, np.zeros((len(new_users), self.user_factors.shape[1]))])
+
+        rows = np.array([self.user_index[int(user)] for user in latest["user_id"].to_numpy()[known]], dtype=np.int64)
+        cols = cols[known]
+        new = latest["rating"].to_numpy(dtype=np.float64)[known]
+        old = np.asarray(self.matrix[rows, cols]).ravel()
+        self.matrix = self.matrix + sp.csr_matrix((new - old, (rows, cols)), shape=self.matrix.shape)
+        self.matrix.eliminate_zeros()  # nota 0 equivale a "não avaliado"
+
+        affected = np.unique(rows)
+        self.user_factors[affected] = solve_factors(
+            self.matrix[affected], self.item_factors, self.regularization, self.implicit, self.alpha
+        )
+
+# Backends disponíveis: cada estado sabe se construir a partir das avaliações, pontuar um bloco de
+# usuários (score), descrever-se em arrays (snapshot) e, se incremental, aplicar eventos (apply_events)
+BACKENDS = {"dense": DenseItemModel, "sparse": SparseItemModel, "als": FactorModel}
+
+class RecommenderModel:
+    """
+    Modelo item-item mantido em memória entre requisições.
+    As matrizes são construídas uma única vez; depois disso, avaliações novas gravadas no log do
+    RatingsStore são lidas e aplicadas incrementalmente, e só uma compactação ou escrita externa
+    no arquivo base provoca reconstrução completa.
+
+    backend="dense" mantém a similaridade densa e aplica cada avaliação em O(usuários + itens);
+    backend="sparse" usa matrizes CSR e, opcionalmente, mantém só os top_k vizinhos por item
+    (nesse caso avaliações novas provocam reconstrução);
+    backend="als" treina uma fatoração de matrizes de baixo posto (options são repassadas ao
+    FactorModel: factors, regularization, iterations, alpha, implicit, threads).
+    Com ratings_path=None o modelo só é construído explicitamente via fit().
+    """
+
+    def __init__(self, ratings_path: str, backend: str = "dense", top_k: int = None, options: dict = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconhecido: {backend}")
+        self.ratings_path = ratings_path
+        self.store = RatingsStore(ratings_path) if ratings_path else None
+        self.backend = backend
+        self.top_k = top_k
+        self.options = dict(options or {})
+        self.version = 0  # incrementado a cada mudança nas avaliações
+        self._rebuild_version = 0  # versão da última construção completa
+        self._user_versions = {}  # user_id -> versão da última avaliação nova do usuário
+        self.state = None
+        self._base_ratings = None
+        self._base_loader = None  # carrega _base_ratings sob demanda (modelo restaurado de snapshot)
+        self._events = []  # eventos aplicados desde a última carga completa
+        self._ratings_df = None
+        self._position = None
+        self._lock = threading.Lock()  # protege o estado
+        self._refresh_lock = threading.Lock()  # evita reconstruções simultâneas
+
+    def fit(self, ratings_df: pd.DataFrame) -> "RecommenderModel":
+        """
+        Constrói as matrizes do modelo a partir de um dataframe de avaliações.
+        """
+        state = self._build_state(ratings_df)
+        with self._lock:
+            self.state = state
+            self._base_ratings, self._base_loader = ratings_df, None
+            self._events, self._ratings_df = [], ratings_df
+            self.version += 1
+            self._rebuild_version, self._user_versions = self.version, {}
+        return self
+
+    def _build_state(self, ratings_df: pd.DataFrame):
+        if self.backend == "sparse":
+            return SparseItemModel(ratings_df, self.top_k)
+        return BACKENDS[self.backend](ratings_df, **self.options)
+
+    def restore(self, state, ratings_loader, position: tuple):
+        """
+        Instala um estado já construído (lido de um snapshot) sem recalcular as matrizes.
+        ratings_loader devolve as avaliações correspondentes ao estado e só é chamado quando
+        alguém precisa delas; position é a posição do armazenamento quando o estado foi gravado,
+        de modo que o próximo refresh() só lê as avaliações gravadas depois disso.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                self.state = state
+                self._base_ratings, self._base_loader = None, ratings_loader
+                self._events, self._ratings_df = [], None
+                self.version += 1
+                self._rebuild_version, self._user_versions = self.version, {}
+            self._position = position
+
+    def export_state(self) -> tuple:
+        """
+        Retorna (estado, avaliações vigentes, posição no armazenamento), atualizados e consistentes entre si.
+        O estado é o próprio objeto em uso: um refresh() posterior pode alterá-lo.
+        """
+        self.refresh()
+        with self._refresh_lock:
+            ratings_df = self.ratings_df
+            with self._lock:
+                return self.state, ratings_df, self._position
+
+    def _base_frame(self) -> pd.DataFrame:
+        # Chamado com _lock adquirido
+        if self._base_ratings is None and self._base_loader is not None:
+            self._base_ratings, self._base_loader = self._base_loader(), None
+        return self._base_ratings
+
+    def apply_ratings(self, events: pd.DataFrame):
+        """
+        Aplica eventos de avaliação (user_id, item_id, rating; nota 0 remove) na ordem recebida.
+        Backends incrementais aplicam os eventos no estado atual; os demais são reconstruídos.
+        """
+        if events.empty:
+            return
+        if not BACKENDS[self.backend].incremental:
+            with self._lock:
+                base, pending = self._base_frame(), self._events + [events]
+            state = self._build_state(apply_log(base, pd.concat(pending, ignore_index=True)))
+            with self._lock:
+                self.state = state
+                self._events, self._ratings_df = pending, None
+                self.version += 1
+                self._touch_users(events)
+            return
+
+        with self._lock:
+            self.state.apply_events(events)
+            self._events.append(events)
+            self._ratings_df = None
+            self.version += 1
+            self._touch_users(events)
+
+    def _touch_users(self, events: pd.DataFrame):
+        # Chamado com _lock adquirido
+        for user_id in events["user_id"].unique():
+            self._user_versions[int(user_id)] = self.version
+
+    def data_version(self, user_id: int) -> tuple:
+        """
+        Versão dos dados usados nas recomendações de um usuário: muda quando o modelo é reconstruído
+        ou quando o próprio usuário tem avaliações novas. Avaliações de outros usuários também alteram
+        a similaridade entre itens, mas não mudam a versão (invalidação por usuário).
+        """
+        with self._lock:
+            return (self._rebuild_version, self._user_versions.get(user_id, 0))
+
+    @property
+    def ratings_df(self) -> pd.DataFrame:
+        """
+        Avaliações vigentes no formato do arquivo (calculadas só quando alguém as pede).
+        """
+        with self._lock:
+            if self._ratings_df is None:
+                base = self._base_frame()
+                self._ratings_df = apply_log(base, pd.concat(self._events, ignore_index=True)) if self._events else base
+            return self._ratings_df
+
+    def refresh(self) -> bool:
+        """
+        Atualiza o modelo com as avaliações gravadas desde a última leitura.
+        Lê só o trecho novo do log quando possível; recarrega tudo se o arquivo base mudou.
+        Retorna True se o modelo mudou.
+        """
+        if self.store is None:
+            return False  # modelo construído diretamente com fit()
+        with self._refresh_lock:
+            if self._position is not None:
+                with stage("load_ratings"):
+                    events, position = self.store.changes_since(self._position)
+                if events is not None:
+                    if not events.empty:
+                        with stage("incremental_update"):
+                            self.apply_ratings(events)
+                    self._position = position
+                    return not events.empty
+            with stage("load_ratings"):
+                ratings_df, position = self.store.load_with_position()
+            self.fit(ratings_df)
+            self._position = position
+            return True
+
+    def get_recommendations(self, user_id: int, items_df: ItemCatalog | pd.DataFrame, top_n: int = 5) -> list:
+        """
+        Gera recomendações para um usuário a partir das matrizes em memória.
+        """
+        return self.recommend_batch([user_id], items_df, top_n)[user_id]
+
+    def sizes(self) -> dict:
+        """
+        Dimensões do modelo em memória (usuários, itens, avaliações e entradas da similaridade).
+        """
+        with self._lock:
+            return {} if self.state is None else self.state.sizes()
+
+    def user_ids(self) -> list:
+        """
+        Lista os IDs de todos os usuários presentes no modelo.
+        """
+        self.refresh()
+        with self._lock:
+            return self.state.active_users()
+
+    def score_block(self, user_ids: list) -> tuple:
+        """
+        Calcula as notas previstas de um bloco de usuários com um único produto matriz-matriz
+        (pela similaridade item-item ou pelos fatores, conforme o backend).
+        Retorna (usuários encontrados, notas dos usuários, scores, item_ids, itens disponíveis),
+        com uma linha por usuário encontrado; itens disponíveis é None quando todos estão.
+        """
+        with self._lock:
+            state = self.state
+            known = [user for user in user_ids if state.has_user(user)]
+            block = state.user_block(known)
+            item_ids = state.item_ids.copy()
+            available = None if state.available is None else state.available.copy()
+            if not known:
+                return known, block, np.empty((0, len(item_ids))), item_ids, available
+            with stage("scoring"):
+                scores = state.score(known, block)
+        return known, block, scores, item_ids, available
+
+    def recommend_batch(self, user_ids: list, items_df: ItemCatalog | pd.DataFrame, top_n: int = 5,
+                        refresh: bool = True) -> dict:
+        """
+        Gera recomendações para vários usuários com um único produto matriz-matriz.
+        Com refresh=False, usa o modelo como está, sem ler as avaliações novas.
+        Retorna um dicionário {user_id: recomendações}; usuários sem avaliações recebem lista vazia.
+        """
+        if refresh:
+            self.refresh()
+        known, block, scores, item_ids, available = self.score_block(user_ids)
+        catalog = as_catalog(items_df)
+
+        with stage("top_n"):
+            tops = [_select_top(block[row], scores[row], item_ids, top_n, available) for row in range(len(known))]
+        results = {user: [] for user in user_ids}
+        with stage("metadata"):
+            for row, (user, top) in enumerate(zip(known, tops)):
+                if top is not None:
+                    results[user] = _format_results(item_ids[top], scores[row][top], catalog)
+        return results
+
+def evaluate_accuracy(user_id: int, items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame,
+                      backend: str = None, top_k: int = None, options: dict = None) -> dict:
     """
     Avalia a acurácia da recomendação dividindo as avaliações do usuário em treino e teste (70/30).
     Acurácia = (número de acertos) / (número de itens recomendados).
+    Sem backend, usa a filtragem item-item original; com backend, treina um RecommenderModel
+    desse backend (top_k e options como no construtor) sobre o treino.
     """
     user_ratings = ratings_df[ratings_df['user_id'] == user_id]
 
@@ -89,7 +890,10 @@ def evaluate_accuracy(user_id: int, items_df: pd.DataFrame, ratings_df: pd.DataF
     train_df = pd.concat([ratings_df[ratings_df['user_id'] != user_id], train_items])
 
     # Gera 5 recomendações com base no treino
-    recs = get_recommendations(user_id, items_df, train_df)
+    if backend is None:
+        recs = get_recommendations(user_id, items_df, train_df)
+    else:
+        recs = RecommenderModel(None, backend, top_k, options).fit(train_df).get_recommendations(user_id, items_df)
 
     if not recs:
         return {"user_id": user_id, "message": "Nenhuma recomendação encontrada para o usuário com base nos dados de treino."}
@@ -115,15 +919,18 @@ def evaluate_accuracy(user_id: int, items_df: pd.DataFrame, ratings_df: pd.DataF
         "accuracy": accuracy
     }
 
-def calculate_overall_accuracy(items_df: pd.DataFrame, ratings_df: pd.DataFrame) -> dict:
+def calculate_overall_accuracy(items_df: ItemCatalog | pd.DataFrame, ratings_df: pd.DataFrame,
+                               backend: str = None, top_k: int = None, options: dict = None) -> dict:
     """
     Calcula a acurácia média do modelo para todos os usuários usando a métrica Precision.
+    backend, top_k e options são repassados a evaluate_accuracy.
     """
     unique_users = ratings_df["user_id"].unique()
+    items_df = as_catalog(items_df)  # índice do catálogo montado uma vez para todos os usuários
     all_accuracies = []
 
     for user_id in unique_users:
-        result = evaluate_accuracy(user_id, items_df, ratings_df)
+        result = evaluate_accuracy(user_id, items_df, ratings_df, backend, top_k, options)
         if "accuracy" in result:
             all_accuracies.append(result["accuracy"])
 
@@ -0,0 +1,171 @@
+"""
+Snapshot binário do modelo de recomendação, para inicialização rápida.
+
+Grava em um diretório, como arquivos .npy, o estado do modelo (IDs de usuários
+e itens, matriz de avaliações, normas e similaridades dos itens), as avaliações
+correspondentes e, em neighbors/, o índice com os top-k vizinhos de cada item.
+Na carga os arquivos são abertos com memory-map: nada é recalculado nem lido
+por inteiro, e vários workers do uvicorn compartilham as mesmas páginas.
+
+meta.json guarda a posição do armazenamento de avaliações no momento da
+gravação; avaliações gravadas depois disso são lidas do log e aplicadas
+incrementalmente no primeiro refresh(). Se o arquivo base mudou (compactação
+ou escrita externa), o snapshot não é usado e precisa ser reconstruído.
+O índice de vizinhos guarda a sua posição da mesma forma: avaliações novas no
+log não o invalidam, só a troca do arquivo base. Snapshot e índice são
+validados e reconstruídos sob o mesmo lock de arquivo.
+
+Uso:
+    python snapshot.py --output model_snapshot
+    python snapshot.py --output model_snapshot --backend sparse --top-k 50
+    python snapshot.py --output model_snapshot --backend als --factors 64
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from filelock import FileLock
+
+from als import add_als_arguments, als_options
+from array_files import load_arrays, read_meta, save_arrays, write_meta
+from neighbors import NeighborIndex, build_neighbor_index, index_options
+from ratings_store import COLUMNS
+from recommender import BACKENDS, RecommenderModel
+
+SNAPSHOT_FORMAT = 1
+
+def _lock(directory: str) -> FileLock:
+    os.makedirs(directory, exist_ok=True)
+    return FileLock(os.path.join(directory, ".lock"))
+
+def _position_from_json(value: list) -> tuple:
+    base_signature, log_id, offset = value
+    return (tuple(base_signature) if base_signature else None, log_id, offset)
+
+def _options(model: RecommenderModel) -> dict:
+    # O número de threads do treino não altera o resultado, então não invalida o snapshot
+    return {name: value for name, value in model.options.items() if name != "threads"}
+
+def _current(model: RecommenderModel, position: list) -> bool:
+    # Dados gravados na posição position continuam válidos se o arquivo base não mudou desde então
+    if position is None or model.store is None:
+        return False
+    events, _ = model.store.changes_since(_position_from_json(position))
+    return events is not None
+
+def _save_locked(model: RecommenderModel, directory: str):
+    state, ratings_df, position = model.export_state()
+    arrays = state.arrays()
+    arrays.update({f"ratings_{col}": ratings_df[col].to_numpy(dtype=np.int64) for col in COLUMNS})
+
+    # Processos que estejam com o snapshot anterior mapeado continuam vendo as páginas antigas
+    save_arrays(directory, arrays)
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "backend": model.backend,
+        "top_k": model.top_k,
+        "options": _options(model),
+        "position": position,
+        "arrays": sorted(arrays),
+        "n_users": len(arrays["user_ids"]),
+        "n_items": len(arrays["item_ids"]),
+    }
+    write_meta(directory, meta)
+
+def _load_locked(model: RecommenderModel, directory: str) -> bool:
+    meta = read_meta(directory)
+    if meta is None:
+        return False
+    if meta.get("format") != SNAPSHOT_FORMAT or meta.get("backend") != model.backend or meta.get("top_k") != model.top_k:
+        return False
+    if meta.get("options", {}) != _options(model):
+        return False
+    if not _current(model, meta["position"]):
+        return False  # o arquivo base mudou depois da gravação
+    position = _position_from_json(meta["position"])
+
+    # Modo cópia-na-escrita nos backends incrementais, que alteram os arrays a cada avaliação nova
+    state_class = BACKENDS[model.backend]
+    mmap_mode = "c" if state_class.incremental else "r"
+    arrays = load_arrays(directory, meta["arrays"], mmap_mode=mmap_mode)
+    state = state_class.from_arrays(arrays)
+
+    def ratings_loader() -> pd.DataFrame:
+        return pd.DataFrame({col: np.array(arrays[f"ratings_{col}"]) for col in COLUMNS})
+
+    model.restore(state, ratings_loader, position)
+    return True
+
+def _neighbors_locked(model: RecommenderModel, directory: str, **options) -> NeighborIndex:
+    # Abre o índice de vizinhos se ele foi construído com os parâmetros pedidos (os não informados
+    # são os do índice salvo) sobre o mesmo arquivo base; senão, reconstrói a partir das avaliações do modelo
+    meta = read_meta(directory)
+    options = index_options(meta, **options)
+    if meta is not None and all(meta.get(name) == value for name, value in options.items()) \
+            and _current(model, meta.get("position")):
+        return NeighborIndex.load(directory)
+
+    _, ratings_df, position = model.export_state()
+    index = build_neighbor_index(ratings_df, **options)
+    index.meta["position"] = position
+    index.save(directory)
+    return NeighborIndex.load(directory)
+
+def save_snapshot(model: RecommenderModel, directory: str, neighbor_k: int = 20):
+    """
+    Grava o estado atual do modelo em directory e, se necessário, o índice de vizinhos em directory/neighbors.
+    """
+    with _lock(directory):
+        _save_locked(model, directory)
+        _neighbors_locked(model, os.path.join(directory, "neighbors"), k=neighbor_k)
+
+def load_snapshot(model: RecommenderModel, directory: str) -> bool:
+    """
+    Restaura o modelo a partir do snapshot em directory (memory-map).
+    Retorna False, sem alterar o modelo, se não houver snapshot compatível com o backend
+    do modelo e com o arquivo de avaliações atual.
+    """
+    with _lock(directory):
+        return _load_locked(model, directory)
+
+def load_or_build(model: RecommenderModel, directory: str, neighbor_dir: str = None, **neighbor_options) -> tuple:
+    """
+    Restaura o modelo do snapshot; se não for possível, constrói o modelo a partir das avaliações
+    e grava um snapshot novo. Em seguida abre o índice de vizinhos de neighbor_dir (por padrão
+    directory/neighbors), reconstruindo-o só se o arquivo base mudou ou se neighbor_options
+    (k, method, n_bits, n_tables; None = como no índice salvo) pedem outro índice.
+    Retorna (True se o snapshot foi usado, índice de vizinhos).
+    O lock de arquivo garante que só um worker reconstrói; os demais esperam e carregam o resultado.
+    """
+    with _lock(directory):
+        used = _load_locked(model, directory)
+        if not used:
+            _save_locked(model, directory)
+        neighbor_dir = neighbor_dir or os.path.join(directory, "neighbors")
+        return used, _neighbors_locked(model, neighbor_dir, **neighbor_options)
+
+def main():
+    parser = argparse.ArgumentParser(description="Grava o snapshot binário do modelo de recomendação.")
+    parser.add_argument("--ratings", default="ratings.csv", help="Arquivo de avaliações")
+    parser.add_argument("--output", default="model_snapshot", help="Diretório do snapshot")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="dense")
+    parser.add_argument("--top-k", type=int, default=None, help="Vizinhos guardados por item (backend esparso)")
+    parser.add_argument("--neighbors-k", type=int, default=20, help="Vizinhos no índice de itens similares")
+    add_als_arguments(parser)
+    args = parser.parse_args()
+
+    options = als_options(args) if args.backend == "als" else None
+    model = RecommenderModel(args.ratings, backend=args.backend, top_k=args.top_k, options=options)
+    start = time.perf_counter()
+    save_snapshot(model, args.output, args.neighbors_k)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_snapshot(RecommenderModel(args.ratings, backend=args.backend, top_k=args.top_k, options=options), args.output)
+    print(f"Snapshot salvo em {args.output} em {elapsed:.2f}s (carga: {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Gerador de dados sintéticos para testes de escala.
+
+Produz um items.csv e um ratings.csv no formato do projeto com distribuições
+de cauda longa, como em dados reais: a popularidade dos itens segue uma lei
+de Zipf (poucos itens concentram a maioria das avaliações) e a atividade dos
+usuários segue uma distribuição de Pareto (poucos usuários avaliam muito).
+As notas combinam a qualidade do item, o viés do usuário e ruído.
+
+Uso:
+    python synthetic_data.py --users 10000 --items 1000 --output-dir bench_data/10k_1k
+    python synthetic_data.py --users 1000000 --items 100000 --ratings-per-user 20 --output-dir bench_data/1m_100k
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Shounen", "Seinen", "Romance", "Comédia", "Shoujo", "Suspense", "Josei", "Sci-Fi"]
+CATEGORY_WEIGHTS = [45, 20, 11, 8, 7, 6, 2, 1]  # proporções do catálogo original
+TITLE_WORDS = [
+    "Naruto", "Dragon", "Blade", "Ghost", "Shadow", "Spirit", "Hunter", "Star", "Moon", "Sky",
+    "Fire", "Ice", "Storm", "Ninja", "Samurai", "Pirate", "Academy", "Chronicles", "Legend", "Quest",
+    "Heart", "Dream", "Night", "Sakura", "Tokyo", "Kingdom", "Titan", "Demon", "Angel", "Alchemist",
+    "Detective", "Soul", "Wind", "Ocean", "Crimson", "Silver", "Golden", "Black", "White", "Blue",
+]
+
+def generate_items(n_items: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Catálogo com n_items itens: títulos combinando palavras (para testar a busca), categorias
+    nas proporções do catálogo original, autores e anos aleatórios.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.asarray(TITLE_WORDS)
+    first, second = rng.integers(0, len(words), n_items), rng.integers(0, len(words), n_items)
+    item_ids = np.arange(1, n_items + 1)
+    weights = np.asarray(CATEGORY_WEIGHTS, dtype=np.float64)
+    return pd.DataFrame({
+        "item_id": item_ids,
+        "title": [f"{a} {b} {i}" for a, b, i in zip(words[first], words[second], item_ids)],
+        "category": np.asarray(CATEGORIES)[rng.choice(len(CATEGORIES), n_items, p=weights / weights.sum())],
+        "author": [f"Autor {author}" for author in rng.integers(1, max(2, n_items // 5), n_items)],
+        "year": rng.integers(1970, 2025, n_items),
+        "image_url": "",
+    })
+
+def generate_ratings(n_users: int, n_items: int, ratings_per_user: float = 20, item_alpha: float = 1.0,
+                     user_shape: float = 1.5, seed: int = 42) -> pd.DataFrame:
+    """
+    Avaliações com popularidade dos itens em lei de Zipf (expoente item_alpha) e quantidade de
+    avaliações por usuário em Pareto (forma user_shape), com média ~ratings_per_user.
+    Cada par usuário/item aparece no máximo uma vez.
+    """
+    rng = np.random.default_rng(seed)
+
+    activity = rng.pareto(user_shape, n_users) + 1
+    counts = np.rint(activity / activity.mean() * ratings_per_user).astype(np.int64)
+    counts = np.clip(counts, 1, n_items)
+
+    # Zipf sobre uma ordem aleatória, para que a popularidade não dependa do item_id
+    ranks = rng.permutation(n_items) + 1
+    popularity = 1.0 / ranks ** item_alpha
+    users = np.repeat(np.arange(1, n_users + 1, dtype=np.int64), counts)
+    items = rng.choice(n_items, size=len(users), p=popularity / popularity.sum()).astype(np.int64) + 1
+
+    # Sorteios repetidos do mesmo item para o mesmo usuário viram uma única avaliação
+    _, first = np.unique(users * (n_items + 1) + items, return_index=True)
+    first.sort()
+    users, items = users[first], items[first]
+
+    quality = rng.normal(3.5, 0.7, n_items)
+    bias = rng.normal(0.0, 0.5, n_users)
+    ratings = quality[items - 1] + bias[users - 1] + rng.normal(0.0, 0.8, len(users))
+    return pd.DataFrame({
+        "user_id": users,
+        "item_id": items,
+        "rating": np.clip(np.rint(ratings), 1, 5).astype(np.int64),
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera items.csv e ratings.csv sintéticos com distribuições de cauda longa.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--ratings-per-user", type=float, default=20, help="Média de avaliações por usuário")
+    parser.add_argument("--item-alpha", type=float, default=1.0, help="Expoente de Zipf da popularidade dos itens")
+    parser.add_argument("--user-shape", type=float, default=1.5, help="Forma da Pareto da atividade dos usuários")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", required=True, help="Diretório onde gravar items.csv e ratings.csv")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    items = generate_items(args.items, args.seed)
+    ratings = generate_ratings(args.users, args.items, args.ratings_per_user, args.item_alpha, args.user_shape, args.seed)
+    items.to_csv(os.path.join(args.output_dir, "items.csv"), index=False)
+    ratings.to_csv(os.path.join(args.output_dir, "ratings.csv"), index=False)
+    print(f"{len(items)} itens e {len(ratings)} avaliações de {ratings['user_id'].nunique()} usuários em {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Execução do trabalho pesado fora do event loop da API.
+
+- run_in_executor: roda uma função bloqueante (NumPy, leitura de arquivos) em
+  um executor dedicado, preservando as variáveis de contexto (ex.: o profiling
+  da requisição).
+- SingleFlight: requisições concorrentes com a mesma chave aguardam uma única
+  execução em andamento, em vez de cada uma repetir o mesmo trabalho.
+- JobManager: tarefas longas (avaliações do modelo) rodam em segundo plano;
+  a requisição recebe um job_id e consulta o status/resultado depois.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor
+
+async def run_in_executor(executor: Executor, func, *args, **kwargs):
+    """
+    Executa func(*args, **kwargs) no executor sem bloquear o event loop.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes com a mesma chave em uma única execução.
+    Deve ser usado sempre a partir do mesmo event loop.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, coroutine_function, *args):
+        """
+        Aguarda a execução em andamento para key ou inicia coroutine_function(*args).
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coroutine_function(*args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: se uma das requisições for cancelada, as demais continuam aguardando a execução
+        return await asyncio.shield(future)
+
+class JobManager:
+    """
+    Tarefas em segundo plano com status consultável.
+    Uma tarefa com a mesma chave de outra pendente, em execução ou concluída é reaproveitada
+    (ex.: a mesma avaliação sobre a mesma versão dos dados); tarefas com erro são refeitas.
+    Guarda as últimas max_jobs tarefas.
+    """
+
+    def __init__(self, executor: Executor, max_jobs: int = 100):
+        self.executor = executor
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()  # job_id -> status
+        self._by_key = {}  # (tipo, chave) -> job_id
+        self._job_keys = {}  # job_id -> (tipo, chave)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, key, func, *args, **kwargs) -> dict:
+        """
+        Agenda func(*args, **kwargs) e retorna o status da tarefa (ou da tarefa equivalente já existente).
+        """
+        with self._lock:
+            job_id = self._by_key.get((kind, key))
+            if job_id in self._jobs and self._jobs[job_id]["status"] != "error":
+                return dict(self._jobs[job_id])
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id, "kind": kind, "status": "pending",
+                "submitted_at": time.time(), "started_at": None, "finished_at": None,
+            }
+            self._by_key[(kind, key)] = job_id
+            self._job_keys[job_id] = (kind, key)
+            while len(self._jobs) > self.max_jobs:
+                old_id, _ = self._jobs.popitem(last=False)
+                old_key = self._job_keys.pop(old_id)
+                if self._by_key.get(old_key) == old_id:
+                    del self._by_key[old_key]
+            status = dict(self._jobs[job_id])
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+        return status
+
+    def _run(self, job_id: str, func, args: tuple, kwargs: dict):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            traceback.print_exc()
+            self._update(job_id, status="error", error=str(exc), finished_at=time.time())
+        else:
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def status(self, job_id: str):
+        """
+        Status da tarefa (com "result" quando concluída e "error" quando falhou), ou None.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from catalog import ItemCatalog
+from catalog_index import CatalogIndex
+from ratings_store import COLUMNS, RatingsStore
+from recommender import RecommenderModel
+
+def _pair_rows(ratings_df: pd.DataFrame, user_id: int, item_id: int) -> list:
+    rows = ratings_df[(ratings_df["user_id"] == user_id) & (ratings_df["item_id"] == item_id)]
+    return rows["rating"].tolist()
+
+def test_delete_then_reinsert_keeps_single_row(tmp_path):
+    path = tmp_path / "ratings.csv"
+    pd.DataFrame([(1, 1, 3), (2, 1, 4), (1, 1, 3), (2, 2, 5)], columns=COLUMNS).to_csv(path, index=False)
+    store = RatingsStore(str(path))
+    catalog_index = CatalogIndex(ItemCatalog(pd.DataFrame({"item_id": [1, 2], "title": ["A", "B"], "category": "X"})), store)
+    model = RecommenderModel(store.path, "dense")
+    model.refresh()
+
+    store.delete(1, 1)
+    model.refresh()  # lê a remoção antes da nova avaliação, sobre as avaliações já combinadas
+    store.upsert(1, 1, 1)
+    model.refresh()
+    catalog_index.refresh()
+
+    expected = store.load()
+    assert _pair_rows(expected, 1, 1) == [1]
+    assert model.ratings_df.values.tolist() == expected.values.tolist()
+    item = catalog_index.item(1)
+    assert (item["rating_count"], item["avg_rating"]) == (2, 2.5)
+
+    store.compact()
+    assert store.load().values.tolist() == expected.values.tolist()
+    assert CatalogIndex(catalog_index.catalog, store).item(1) == item
+
+def test_upsert_collapses_duplicate_base_rows(tmp_path):
+    path = tmp_path / "ratings.csv"
+    pd.DataFrame([(1, 1, 3), (1, 2, 4), (1, 1, 5)], columns=COLUMNS).to_csv(path, index=False)
+    store = RatingsStore(str(path))
+
+    store.upsert(1, 1, 2)
+    assert store.load().values.tolist() == [[1, 1, 2], [1, 2, 4]]
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog import ItemCatalog
+from ratings_store import RatingsStore
+from recommender import RecommenderModel
+
+N_USERS, N_ITEMS = 40, 25
+
+@pytest.fixture
+def store(tmp_path):
+    rng = np.random.default_rng(7)
+    users = rng.integers(1, N_USERS + 1, 400)
+    items = rng.integers(1, N_ITEMS + 1, 400)
+    ratings = rng.integers(1, 6, 400)
+    path = tmp_path / "ratings.csv"
+    pd.DataFrame({"user_id": users, "item_id": items, "rating": ratings}).to_csv(path, index=False)
+    return RatingsStore(str(path))
+
+@pytest.fixture
+def catalog():
+    item_ids = np.arange(1, N_ITEMS + 10)
+    return ItemCatalog(pd.DataFrame({
+        "item_id": item_ids,
+        "title": [f"Mangá {item}" for item in item_ids],
+        "category": "Shounen",
+    }))
+
+def _events(store: RatingsStore, rng: np.random.Generator, n_events: int) -> list:
+    current = store.load()
+    events = []
+    for _ in range(n_events):
+        kind = rng.integers(4)
+        if kind == 0:  # atualização de um par existente
+            row = current.iloc[rng.integers(len(current))]
+            events.append((int(row.user_id), int(row.item_id), int(rng.integers(1, 6))))
+        elif kind == 1:  # remoção de um par existente
+            row = current.iloc[rng.integers(len(current))]
+            events.append((int(row.user_id), int(row.item_id), 0))
+        elif kind == 2:  # usuário novo
+            events.append((int(rng.integers(N_USERS + 1, N_USERS + 10)), int(rng.integers(1, N_ITEMS + 1)), int(rng.integers(1, 6))))
+        else:  # item novo
+            events.append((int(rng.integers(1, N_USERS + 1)), int(rng.integers(N_ITEMS + 1, N_ITEMS + 10)), int(rng.integers(1, 6))))
+    return events
+
+def _assert_same_model(model: RecommenderModel, rebuilt: RecommenderModel, catalog: ItemCatalog):
+    # Itens do modelo incremental na ordem do modelo reconstruído (que não tem itens sem avaliações)
+    positions = {int(item): idx for idx, item in enumerate(model.state.item_ids)}
+    order = [positions[int(item)] for item in rebuilt.state.item_ids]
+    np.testing.assert_allclose(model.state.sim[np.ix_(order, order)], rebuilt.state.sim, atol=1e-12)
+
+    users = rebuilt.user_ids()
+    assert sorted(model.user_ids()) == sorted(users)
+    incremental = model.recommend_batch(users, catalog, top_n=10)
+    expected = rebuilt.recommend_batch(users, catalog, top_n=10)
+    for user in users:
+        assert [r["item_id"] for r in incremental[user]] == [r["item_id"] for r in expected[user]]
+        np.testing.assert_allclose(
+            [r["score"] for r in incremental[user]], [r["score"] for r in expected[user]], atol=1e-12
+        )
+
+def test_incremental_dense_matches_rebuild(store, catalog):
+    model = RecommenderModel(store.path, "dense")
+    model.refresh()
+    rng = np.random.default_rng(42)
+
+    for _ in range(5):
+        version = model.version
+        store.upsert_many(_events(store, rng, 30))
+        assert model.refresh()
+        assert model.version > version  # aplicado incrementalmente, sem reconstrução
+        assert model._rebuild_version == 1
+        _assert_same_model(model, RecommenderModel(None, "dense").fit(store.load()), catalog)
+
+def test_refresh_without_changes_keeps_model(store):
+    model = RecommenderModel(store.path, "dense")
+    model.refresh()
+    version = model.version
+    assert not model.refresh()
+    assert model.version == version
+
+def test_new_user_after_snapshot_keeps_item_matrices_mapped(store, catalog, tmp_path):
+    import snapshot
+
+    snapshot.save_snapshot(RecommenderModel(store.path, "dense"), str(tmp_path / "snapshot"))
+    model = RecommenderModel(store.path, "dense")
+    assert snapshot.load_snapshot(model, str(tmp_path / "snapshot"))
+
+    store.upsert(N_USERS + 100, 1, 5)  # usuário novo, item existente
+    assert model.refresh()
+    for name in ("_gram", "_sim", "_abs_sim"):
+        assert isinstance(getattr(model.state, name), np.memmap)
+    _assert_same_model(model, RecommenderModel(None, "dense").fit(store.load()), catalog)
+
+def test_cold_start_after_new_rating_reuses_snapshot_and_neighbors(store, tmp_path, monkeypatch):
+    import snapshot
+
+    directory = str(tmp_path / "snapshot")
+    used, index = snapshot.load_or_build(RecommenderModel(store.path, "dense"), directory)
+    assert not used
+    built_at = index.meta["position"]
+
+    store.upsert(N_USERS + 100, 1, 5)
+    # Partida a frio: nem o snapshot nem o índice de vizinhos podem ler o CSV inteiro
+    monkeypatch.setattr(RatingsStore, "load", lambda self: pytest.fail("leu o CSV"))
+    monkeypatch.setattr(RatingsStore, "load_with_position", lambda self: pytest.fail("leu o CSV"))
+    used, index = snapshot.load_or_build(RecommenderModel(store.path, "dense"), directory)
+    assert used
+    assert index.meta["position"] == built_at
+    assert isinstance(index.neighbors, np.memmap)
+
+    monkeypatch.undo()
+    store.compact()  # arquivo base reescrito: snapshot e índice são reconstruídos
+    used, index = snapshot.load_or_build(RecommenderModel(store.path, "dense"), directory, method="lsh", n_bits=4)
+    assert not used
+    rebuilt_at = index.meta["position"]
+    # Sem parâmetros informados, o índice LSH salvo é mantido
+    _, index = snapshot.load_or_build(RecommenderModel(store.path, "dense"), directory)
+    assert (index.meta["method"], index.meta["n_bits"], index.meta["position"]) == ("lsh", 4, rebuilt_at)
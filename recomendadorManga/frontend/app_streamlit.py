@@ -1,9 +1,9 @@
 import streamlit as st
-import pandas as pd
 import os
+import sys
 import requests
 import altair as alt
-import math
+import time
 from streamlit_extras.card import card
 from streamlit_option_menu import option_menu
 
@@ -30,36 +30,60 @@ if 'page' not in st.session_state:
     st.session_state.page = 1
 
 # --- Constantes e Carregamento de Dados ---
-ITEMS_CSV = "../backend/items.csv"
-RATINGS_CSV = "../backend/ratings.csv"
+BACKEND_DIR = "../backend"
+ITEMS_CSV = os.path.join(BACKEND_DIR, "items.csv")
+RATINGS_CSV = os.path.join(BACKEND_DIR, "ratings.csv")
 API_URL = "http://127.0.0.1:8000"
 
-@st.cache_data
+# O armazenamento de avaliações é compartilhado com o backend
+sys.path.append(BACKEND_DIR)
+from catalog import ItemCatalog
+from ratings_store import RatingsStore
+
+ratings_store = RatingsStore(RATINGS_CSV)
+
+@st.cache_resource
+def load_items():
+    """
+    Carrega o catálogo de itens (busca por ID/título em O(1)).
+    Fica em cache como recurso compartilhado, sem ser copiado a cada execução.
+    """
+    return ItemCatalog.from_csv(ITEMS_CSV)
+
+@st.cache_data(max_entries=1)
+def load_ratings(signature):
+    """
+    Carrega as avaliações vigentes. A assinatura dos arquivos faz parte da chave do cache,
+    então uma nova avaliação só invalida este cache (e não o catálogo); só a versão mais
+    recente fica guardada.
+    """
+    return ratings_store.load()
+
 def load_data():
-    """Carrega os dados dos arquivos CSV, com cache para performance."""
-    items = pd.read_csv(ITEMS_CSV)
-    if os.path.exists(RATINGS_CSV):
-        ratings = pd.read_csv(RATINGS_CSV)
-        for col in ["user_id", "item_id", "rating"]:
-            ratings[col] = pd.to_numeric(ratings[col], errors="coerce").fillna(0).astype(int)
-    else:
-        ratings = pd.DataFrame(columns=["user_id", "item_id", "rating"])
-    return items, ratings
+    """Carrega itens e avaliações."""
+    return load_items(), load_ratings(ratings_store.signature())
 
-def get_items_with_avg(items_df, ratings_df):
-    """Calcula a média de avaliação para cada item."""
-    if ratings_df.empty:
-        items_with_avg = items_df.copy()
-        items_with_avg['avg_rating'] = 0
-        return items_with_avg
-        
-    avg_ratings = ratings_df.groupby("item_id")["rating"].mean().reset_index()
-    items_with_avg = items_df.merge(avg_ratings, on="item_id", how="left").fillna(0)
-    items_with_avg.rename(columns={"rating": "avg_rating"}, inplace=True)
-    return items_with_avg
+@st.cache_resource
+def load_categories():
+    """Categorias do catálogo, para o filtro."""
+    return sorted(set(load_items().column("category")))
+
+def fetch_catalog_page(query, category, page, per_page):
+    """Busca uma página do catálogo (com a média de cada item) na API."""
+    params = {"q": query, "page": page, "per_page": per_page}
+    if category != "Todas":
+        params["category"] = category
+    response = requests.get(f"{API_URL}/catalogo", params=params, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_catalog_item(item_id):
+    """Busca os dados de um mangá (com a média das avaliações) na API."""
+    response = requests.get(f"{API_URL}/catalogo/{item_id}", timeout=5)
+    response.raise_for_status()
+    return response.json()
 
-items_df, ratings_df = load_data()
-items_with_avg = get_items_with_avg(items_df, ratings_df)
+catalog, ratings_df = load_data()
 
 # --- Funções Auxiliares ---
 def set_selected_manga_and_rerun(item_id):
@@ -73,30 +97,30 @@ def display_catalog():
     st.header(" Catálogo de Mangás")
     # ... (código do catálogo permanece o mesmo)
     search_query = st.text_input("Buscar por título", key="search_input")
-    categories = ["Todas"] + sorted(items_with_avg["category"].unique().tolist())
+    categories = ["Todas"] + load_categories()
     selected_category = st.selectbox("Filtrar por Categoria", options=categories, key="category_select")
 
-    filtered_items = items_with_avg
-    if search_query:
-        filtered_items = filtered_items[filtered_items["title"].str.contains(search_query, case=False, na=False)]
-    if selected_category != "Todas":
-        filtered_items = filtered_items[filtered_items["category"] == selected_category]
+    # Busca, filtro, paginação e médias ficam no backend: só a página exibida é transferida
+    ITEMS_PER_PAGE = 12
+    try:
+        result = fetch_catalog_page(search_query, selected_category, st.session_state.page, ITEMS_PER_PAGE)
+        if st.session_state.page > result["pages"] > 0:
+            st.session_state.page = 1
+            result = fetch_catalog_page(search_query, selected_category, 1, ITEMS_PER_PAGE)
+    except requests.RequestException as e:
+        st.error(f"Erro ao carregar o catálogo: {e}")
+        return
 
-    if filtered_items.empty:
+    if not result["items"]:
         st.warning("Nenhum mangá encontrado.")
     else:
-        ITEMS_PER_PAGE = 12
-        total_pages = math.ceil(len(filtered_items) / ITEMS_PER_PAGE)
-        if st.session_state.page > total_pages and total_pages > 0:
-            st.session_state.page = 1
-        
-        start_idx = (st.session_state.page - 1) * ITEMS_PER_PAGE
-        paginated_items = filtered_items.iloc[start_idx : start_idx + ITEMS_PER_PAGE]
+        total_pages = result["pages"]
+        paginated_items = result["items"]
 
         for i in range(0, len(paginated_items), 4):
             cols = st.columns(4)
-            row_items = paginated_items.iloc[i:i+4]
-            for j, (_, row) in enumerate(row_items.iterrows()):
+            row_items = paginated_items[i:i+4]
+            for j, row in enumerate(row_items):
                 with cols[j]:
                     card(
                         title=f"{row['title']}",
@@ -127,27 +151,24 @@ def display_add_rating():
     global ratings_df
     
     new_user_id = st.number_input("ID do Usuário", min_value=1, step=1, value=st.session_state.current_user_id)
-    manga_titles = items_df["title"].tolist()
+    manga_titles = catalog.column("title")
     selected_manga_title = st.selectbox("Nome do Mangá", manga_titles)
-    new_item_id = items_df[items_df["title"] == selected_manga_title]["item_id"].iloc[0]
+    new_item_id = catalog.id_by_title(selected_manga_title)
     st.write(f"ID do Mangá Selecionado: {new_item_id}")
     new_rating = st.slider("Nota do Mangá", 1, 5, 3)
 
     if st.button("Salvar Avaliação"):
-        exists_index = ratings_df[
+        exists = (
             (ratings_df["user_id"] == new_user_id) & (ratings_df["item_id"] == new_item_id)
-        ].index
+        ).any()
 
-        if not exists_index.empty:
-            ratings_df.loc[exists_index, "rating"] = new_rating
+        # Grava só o evento no log de avaliações, sem reescrever o CSV inteiro
+        ratings_store.upsert(new_user_id, new_item_id, new_rating)
+        if exists:
             st.session_state.toast_message = {"message": "✅ Avaliação atualizada com sucesso!", "icon": "✅"}
         else:
-            new_row = pd.DataFrame([{"user_id": new_user_id, "item_id": new_item_id, "rating": new_rating}])
-            ratings_df = pd.concat([ratings_df, new_row], ignore_index=True)
             st.session_state.toast_message = {"message": "✅ Avaliação adicionada com sucesso!", "icon": "✅"}
-
-        ratings_df.to_csv(RATINGS_CSV, index=False)
-        st.cache_data.clear()
+        _, ratings_df = load_data()
 
         # Mostra o aviso imediatamente
         st.toast(st.session_state.toast_message["message"], icon=st.session_state.toast_message["icon"])
@@ -171,14 +192,14 @@ def display_recommendations():
                     response = requests.get(f"{API_URL}/recomendar/{selected_user}")
                     response.raise_for_status() 
                     recs = response.json().get("recommendations", [])
+                    recs = [rec for rec in recs if rec["item_id"] in catalog]
                     if recs:
-                        rec_df = pd.DataFrame(recs).merge(items_df[['item_id', 'image_url']], on='item_id')
                         st.subheader(f"Recomendações para Usuário {selected_user}")
-                        cols = st.columns(len(rec_df))
-                        for i, (_, row) in enumerate(rec_df.iterrows()):
+                        cols = st.columns(len(recs))
+                        for i, rec in enumerate(recs):
                             with cols[i]:
-                                st.image(row['image_url'], caption=row['title'], use_container_width=True)
-                                st.write(f"**Score:** {row['score']:.2f}")
+                                st.image(catalog.get(rec["item_id"])["image_url"], caption=rec["title"], use_container_width=True)
+                                st.write(f"**Score:** {rec['score']:.2f}")
                     else:
                         st.warning("Nenhuma recomendação encontrada para este usuário.")
                 except requests.RequestException as e:
@@ -215,22 +236,40 @@ def display_accuracy():
         if st.button("Calcular Acurácia Geral"):
             with st.spinner("Calculando acurácia para todos os usuários..."):
                 try:
+                    # A avaliação roda em segundo plano no backend; acompanha a tarefa até terminar
                     response = requests.get(f"{API_URL}/avaliar_acuracia_geral")
                     response.raise_for_status()
-                    result = response.json()
-                    st.metric("Acurácia Média Global", f"{result.get('overall_accuracy', 0):.2%}")
-                    st.write(f"**Total de usuários avaliados:** {result.get('total_users_evaluated', 0)}")
+                    job = response.json()
+                    deadline = time.monotonic() + 300
+                    while job["status"] in ("pending", "running") and time.monotonic() < deadline:
+                        time.sleep(0.5)
+                        response = requests.get(f"{API_URL}{job['status_url']}")
+                        response.raise_for_status()
+                        job = response.json()
+
+                    if job["status"] == "done":
+                        result = job["result"]
+                        st.metric("Acurácia Média Global", f"{result.get('overall_accuracy', 0):.2%}")
+                        st.write(f"**Total de usuários avaliados:** {result.get('total_users_evaluated', 0)}")
+                    elif job["status"] == "error":
+                        st.error(f"Erro ao calcular a acurácia geral: {job.get('error')}")
+                    else:
+                        st.warning("A avaliação ainda está em andamento. Tente novamente em instantes.")
                 except requests.RequestException as e:
                     st.error(f"Erro de conexão ou endpoint não encontrado: {e}")
 
 def display_manga_details(item_id):
     """Renderiza a página de detalhes de um mangá específico."""
-    global ratings_df
     if st.button(" Voltar ao Catálogo", key="back_button"):
         st.session_state.selected_manga_id = None
         st.rerun()
 
-    selected_item = items_with_avg.loc[items_with_avg["item_id"] == item_id].iloc[0]
+    # A média vem do índice do catálogo no backend, sem varrer as avaliações
+    try:
+        selected_item = fetch_catalog_item(item_id)
+    except requests.RequestException as e:
+        st.error(f"Erro ao carregar o mangá: {e}")
+        return
     st.header(selected_item["title"])
     col1, col2 = st.columns([1, 2])
     with col1:
@@ -242,6 +281,23 @@ def display_manga_details(item_id):
         st.write(f"**Categoria:** {selected_item['category']}")
         st.write(f"**Média:** ⭐ {selected_item['avg_rating']:.2f}" if selected_item['avg_rating'] > 0 else "Sem avaliações")
 
+    st.markdown("---")
+    st.subheader("Mangás Parecidos")
+    try:
+        response = requests.get(f"{API_URL}/similares/{item_id}", params={"n": 5}, timeout=5)
+        response.raise_for_status()
+        similar = response.json().get("similar", [])
+        similar = [item for item in similar if item["item_id"] in catalog]
+        if similar:
+            cols = st.columns(len(similar))
+            for i, item in enumerate(similar):
+                with cols[i]:
+                    st.image(catalog.get(item["item_id"])["image_url"], caption=item["title"], use_container_width=True)
+        else:
+            st.info("Ainda não há avaliações suficientes para encontrar mangás parecidos.")
+    except requests.RequestException as e:
+        st.warning(f"Não foi possível buscar mangás parecidos: {e}")
+
     st.markdown("---")
     st.subheader("Sua Avaliação")
     current_user_id = st.number_input("Seu ID de usuário", min_value=1, step=1, value=st.session_state.current_user_id, key='user_id_input_detail')
@@ -253,16 +309,12 @@ def display_manga_details(item_id):
     
     new_rating = st.slider("Nota", 1, 5, initial_rating)
     if st.button("Salvar Minha Avaliação"):
+        # Grava só o evento no log de avaliações, sem reescrever o CSV inteiro
+        ratings_store.upsert(current_user_id, item_id, new_rating)
         if not user_rating_row.empty:
-            ratings_df.loc[user_rating_row.index, "rating"] = new_rating
             st.session_state.toast_message = {"message": "✅ Avaliação atualizada com sucesso!", "icon": "✅"}
         else:
-            new_row = pd.DataFrame([{"user_id": current_user_id, "item_id": item_id, "rating": new_rating}])
-            ratings_df = pd.concat([ratings_df, new_row], ignore_index=True)
             st.session_state.toast_message = {"message": "✅ Avaliação adicionada com sucesso!", "icon": "✅"}
-        
-        ratings_df.to_csv(RATINGS_CSV, index=False)
-        st.cache_data.clear()
         st.rerun()
 
 # --- Renderização Principal ---